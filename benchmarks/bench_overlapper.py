@@ -0,0 +1,284 @@
+'''
+Overlapper benchmarks.
+
+Times the headless engine (overlapper_engine.py) on generated glyphs, from
+10 to 10,000 points, and optionally on real glyphs from UFOs. Each operation
+is run a number of times and reported as latency percentiles, plus the peak
+memory one run allocates (measured separately, with tracemalloc on). For example:
+
+    python benchmarks/bench_overlapper.py
+    python benchmarks/bench_overlapper.py --ufo MyFont-Bold.ufo --glyphs A V W
+    python benchmarks/bench_overlapper.py --save-baseline
+    python benchmarks/bench_overlapper.py --compare
+
+Operations:
+    overlap   the whole gesture, every on-curve selected, +20 units
+    chamfer   the same, -10 units
+    cross     cross-overlap of pairs of T-junction corners
+    preview   one frame of a drag: new offset, preview contours updated in place
+
+Baselines are kept in baselines.json next to this file. `--compare` fails
+(exit code 1) if any median got slower than the baseline by more than
+`--threshold`. Timings depend on the machine, so save a baseline on the
+machine you compare on.
+'''
+
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'source', 'lib'))
+import overlapper_engine as engine
+
+BASELINE_PATH = os.path.join(HERE, 'baselines.json')
+SIZES = [10, 100, 1000, 10000]
+OPERATIONS = ['overlap', 'chamfer', 'cross', 'preview']
+# A T-junction: points 4 and 7 are the inside corners that cross-overlap.
+T_SHAPE = [(0, 200), (0, 300), (300, 300), (300, 200), (200, 200), (200, 0), (100, 0), (100, 200)]
+
+
+# ======================================================================================
+# Glyphs to work on
+
+
+def make_gear(point_count, center=(0, 0), radius=400):
+    '''A closed contour of about `point_count` points: teeth with straight sides, and curved tips.'''
+    cx, cy = center
+    tooth_count = max(2, point_count // 5)
+    points = []
+    for i in range(tooth_count):
+        a = 2 * math.pi * i / tooth_count
+        step = 2 * math.pi / tooth_count
+        inner, outer = radius * 0.8, radius
+        # Root corner, then up the side to a curved tip
+        points.append(engine.OverlapPoint(cx + inner * math.cos(a), cy + inner * math.sin(a), 'line'))
+        points.append(engine.OverlapPoint(cx + outer * math.cos(a + step * 0.25), cy + outer * math.sin(a + step * 0.25), 'line'))
+        points.append(engine.OverlapPoint(cx + outer * 1.05 * math.cos(a + step * 0.35), cy + outer * 1.05 * math.sin(a + step * 0.35), 'offcurve'))
+        points.append(engine.OverlapPoint(cx + outer * 1.05 * math.cos(a + step * 0.55), cy + outer * 1.05 * math.sin(a + step * 0.55), 'offcurve'))
+        points.append(engine.OverlapPoint(cx + outer * math.cos(a + step * 0.65), cy + outer * math.sin(a + step * 0.65), 'curve'))
+    return engine.OverlapContour(points)
+
+def make_glyph(point_count):
+    '''
+    Roughly `point_count` points: one T-junction contour per 100 points (at
+    least one), and a gear for the rest. Returns (contours, cross pairs), where
+    the cross pairs are the T-junctions’ inside corners.
+    '''
+    t_count = max(1, point_count // 100)
+    contours = []
+    cross_points = []
+    for i in range(t_count):
+        c = engine.OverlapContour([engine.OverlapPoint(x + (i % 10) * 400, y + (i // 10) * 400) for x, y in T_SHAPE])
+        contours.append(c)
+        cross_points += [c.points[4], c.points[7]]
+    remaining = point_count - t_count * len(T_SHAPE)
+    if remaining >= 10:
+        contours.append(make_gear(remaining, center=(-1000, -1000), radius=max(400, remaining)))
+    return contours, cross_points
+
+def read_ufo_glyphs(ufo_path, glyph_names=None):
+    '''{name: contours} for the glyphs of a UFO’s default layer.'''
+    from fontTools.ufoLib import UFOReader
+    reader = UFOReader(ufo_path)
+    try:
+        glyph_set = reader.getGlyphSet()
+        glyphs = {}
+        for name in glyph_names or sorted(glyph_set.keys()):
+            if name not in glyph_set:
+                continue
+            pen = engine.ContourPointPen()
+            glyph_set.readGlyph(name, None, pen)
+            if pen.contours:
+                glyphs[name] = pen.contours
+    finally:
+        reader.close()
+    return glyphs
+
+def get_on_curves(contours):
+    return [pt for c in contours for pt in c.points if pt.type not in ('offcurve', 'move')]
+
+
+# ======================================================================================
+# Operations. Each one returns a function that does one run, from fresh copies of the contours.
+
+
+def copy_contours(contours, selected_points):
+    points = set(map(id, selected_points))
+    copies = [c.copy() for c in contours]
+    selected = [copy_pt for c, copy_c in zip(contours, copies) for pt, copy_pt in zip(c.points, copy_c.points) if id(pt) in points]
+    return copies, selected
+
+def prepare_operation(operation, contours, cross_points):
+    if operation in ('overlap', 'chamfer'):
+        offset = 20 if operation == 'overlap' else -10
+        selected = get_on_curves(contours)
+
+        def run():
+            engine.overlap_contours(*copy_contours(contours, selected), offset)
+        return run
+
+    if operation == 'cross':
+        if not cross_points:
+            return None
+
+        def run():
+            engine.overlap_contours(*copy_contours(contours, cross_points), 30, cross=True)
+        return run
+
+    if operation == 'preview':
+        # Everything that happens once per key press is done here; a run is one frame.
+        work_contours, selected = copy_contours(contours, get_on_curves(contours))
+        corners = engine.batch_corners(engine.get_corners(engine.get_selection_index(work_contours, selected)))
+        preview = engine.OverlapPreview(work_contours, corners)
+        offsets = iter(range(10 ** 9))
+
+        def run():
+            offset = 1 + next(offsets) % 50
+            preview.update(*engine.extend_corners(corners, offset))
+        return run
+
+def get_repeat_count(point_count, repeat=None):
+    if repeat:
+        return repeat
+    # Enough runs for a steady p99 on small glyphs, without waiting forever on big ones.
+    return max(5, min(200, 20000 // max(point_count, 1)))
+
+
+# ======================================================================================
+# Measuring
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def measure(run, repeat):
+    '''Times `repeat` runs (after a warm-up run), then one more with tracemalloc on. Returns a result dict.'''
+    run()
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter_ns()
+        run()
+        times.append((time.perf_counter_ns() - start) / 1e6)
+    times.sort()
+
+    tracemalloc.start()
+    try:
+        run()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'runs': repeat,
+        'p50': percentile(times, 0.5),
+        'p90': percentile(times, 0.9),
+        'p99': percentile(times, 0.99),
+        'max': times[-1],
+        'peak_kib': peak / 1024,
+        }
+
+def run_benchmarks(sizes, operations, ufo_glyphs=None, repeat=None, report=print):
+    '''Returns {'operation @ glyph': result}. Glyphs are sizes (generated) or UFO glyph names.'''
+    cases = []
+    for size in sizes:
+        contours, cross_points = make_glyph(size)
+        cases.append((f"{size} pts", contours, cross_points))
+    for name, contours in (ufo_glyphs or {}).items():
+        cases.append((name, contours, []))
+
+    results = {}
+    report(f"{'operation':<10} {'glyph':>12} {'points':>7} {'runs':>5} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9} {'peak KiB':>9}")
+    for glyph_label, contours, cross_points in cases:
+        point_count = sum(len(c.points) for c in contours)
+        for operation in operations:
+            run = prepare_operation(operation, contours, cross_points)
+            if run is None:
+                continue
+            result = measure(run, get_repeat_count(point_count, repeat))
+            result['points'] = point_count
+            results[f"{operation} @ {glyph_label}"] = result
+            report(f"{operation:<10} {glyph_label:>12} {point_count:>7} {result['runs']:>5} {result['p50']:>9.3f} {result['p90']:>9.3f} {result['p99']:>9.3f} {result['max']:>9.3f} {result['peak_kib']:>9.1f}")
+    return results
+
+
+# ======================================================================================
+# Baselines
+
+
+def get_machine():
+    return f"{platform.python_implementation()} {platform.python_version()}, {platform.system()} {platform.machine()}, NumPy {'yes' if engine.numpy is not None else 'no'}"
+
+def save_baseline(results, path=BASELINE_PATH):
+    with open(path, 'w') as f:
+        json.dump({'machine': get_machine(), 'results': results}, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+def compare_to_baseline(results, path=BASELINE_PATH, threshold=0.25, min_change=0.05, report=print):
+    '''Returns the names of the results whose median is more than `threshold` (and `min_change` ms) slower than the baseline.'''
+    with open(path) as f:
+        baseline = json.load(f)
+    if baseline.get('machine') != get_machine():
+        report(f"Note: the baseline was saved on {baseline.get('machine')}, not {get_machine()}.")
+    regressions = []
+    for name, result in results.items():
+        base = baseline['results'].get(name)
+        if base is None:
+            continue
+        change = result['p50'] - base['p50']
+        if change > min_change and result['p50'] > base['p50'] * (1 + threshold):
+            regressions.append(name)
+            report(f"Slower: {name}: {base['p50']:.3f} ms -> {result['p50']:.3f} ms (+{change / base['p50']:.0%})")
+    return regressions
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Time Overlapper’s engine on generated and real glyphs.")
+    parser.add_argument('--sizes', nargs='+', type=int, default=SIZES, metavar='POINTS',
+        help=f"Generated glyph sizes, in points. Default: {' '.join(map(str, SIZES))}.")
+    parser.add_argument('--operations', nargs='+', choices=OPERATIONS, default=OPERATIONS,
+        help="Which operations to time. Default: all of them.")
+    parser.add_argument('--ufo', nargs='+', default=[], metavar='PATH',
+        help="Also time the glyphs of these UFOs (default layer).")
+    parser.add_argument('-g', '--glyphs', nargs='+', metavar='NAME',
+        help="Only these glyphs of the UFOs. Default: all of them.")
+    parser.add_argument('-r', '--repeat', type=int, metavar='N',
+        help="Runs per operation. Default: depends on the glyph size.")
+    parser.add_argument('--save-baseline', action='store_true',
+        help="Save the results as the new baseline.")
+    parser.add_argument('--compare', action='store_true',
+        help="Compare the results to the baseline, and fail if anything got slower.")
+    parser.add_argument('--threshold', type=float, default=0.25,
+        help="How much slower (0.25 = 25%%) a median can get before --compare fails. Default: 0.25.")
+    parser.add_argument('--baseline', default=BASELINE_PATH, metavar='PATH',
+        help="Where the baseline is kept. Default: baselines.json next to this script.")
+    args = parser.parse_args(args)
+
+    ufo_glyphs = {}
+    for ufo_path in args.ufo:
+        ufo_name = os.path.basename(ufo_path.rstrip(os.sep))
+        for name, contours in read_ufo_glyphs(ufo_path, args.glyphs).items():
+            ufo_glyphs[f"{ufo_name}/{name}"] = contours
+
+    print(get_machine())
+    results = run_benchmarks(args.sizes, args.operations, ufo_glyphs, args.repeat)
+    if args.save_baseline:
+        save_baseline(results, args.baseline)
+        print(f"Saved the baseline to {args.baseline}")
+    if args.compare:
+        regressions = compare_to_baseline(results, args.baseline, args.threshold)
+        if regressions:
+            sys.exit(1)
+        print("No regressions.")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,17 @@
 import AppKit
-from fontTools.misc.bezierTools import splitCubicAtT, approximateCubicArcLength
+from Quartz import CGPathCreateMutable, CGPathMoveToPoint, CGPathAddLineToPoint, CGPathAddQuadCurveToPoint, CGPathAddCurveToPoint, CGPathCloseSubpath
 from fontTools.ufoLib.pointPen import PointToSegmentPen  # for Frank’s code setting start points to on-curves
+from fontTools.pens.basePen import decomposeSuperBezierSegment, decomposeQuadraticSegment
 from mojo.subscriber import Subscriber, registerGlyphEditorSubscriber, getRegisteredSubscriberEvents, registerSubscriberEvent
 from mojo.extensions import getExtensionDefault
 from mojo.roboFont import version
 from mojo.UI import CurrentWindow, getDefault
 from mojo.events import postEvent
-from math import sqrt, atan
 import merz
 import time
+from collections import OrderedDict
+import overlapper_engine as engine
+from overlapper_trace import tracer
 if version >= "4.4":
     from mojo.UI import appearanceColorKey
 
@@ -16,220 +19,198 @@ if version >= "4.4":
 DEBUG = False
 
 EXTENSION_KEY = 'com.ryanbugden.overlapper.settings'
+DEFAULT_SETTINGS = {'hotkey': 'v', 'frameRate': 60, 'crossPairing': 0, 'syncMasters': 0, 'traceTimings': False}
+# In the order of the Pairing pop-up in the settings window
+PAIRING_MODES = ['nearest', 'optimal']
+# In the order of the Masters pop-up: which other glyphs get the same overlap on commit
+SYNC_MODES = [None, 'fonts', 'layers']
+# Read once, and again only when the settings window applies changes (see `overlapperSettingsDidChange`),
+# so key presses never go to the preferences.
+SETTINGS = {}
+def load_settings():
+    SETTINGS.clear()
+    SETTINGS.update(DEFAULT_SETTINGS)
+    SETTINGS.update(getExtensionDefault(EXTENSION_KEY, fallback={}))
+
 def get_setting_from_defaults(setting):
-    all_settings = getExtensionDefault(EXTENSION_KEY, fallback={'hotkey': 'v'})
-    return all_settings[setting] 
-
-
-# Testing method from Jackson. Add @timeit before methods to test
-def timeit(method):
-    def timed(*args, **kw):
-        ts = time.time()
-        result = method(*args, **kw)
-        te = time.time()
-        if 'log_time' in kw:
-            name = kw.get('log_name', method.__name__.upper())
-            kw['log_time'][name] = int((te - ts) * 1000)
-        else:
-            if DEBUG == True: print('%r  %2.2f ms' %(method.__name__, (te - ts) * 1000))
-            pass
-        return result
-    return timed
-
-def lengthen_line(pt1, pt2, factor, direction="out"):
-    x1, y1, x2, y2           = pt1[0], pt1[1], pt2[0], pt2[1]
-    delta_x, delta_y         = x2 - x1, y2 - y1
-    new_delta_x, new_delta_y = delta_x * factor, delta_y * factor
-    new_x, new_y             = new_delta_x + x1, new_delta_y + y1
-    
-    if direction == "in":
-        return ((x2, y2), (new_x, new_y))
-    else:
-        return ((new_x, new_y), (x2, y2))
-
-def get_vector_distance(pt1, pt2):
-    try:
-        x1, y1, x2, y2 = pt1.x, pt1.y, pt2.x, pt2.y
-    except:
-        x1, y1, x2, y2 = pt1[0], pt1[1], pt2[0], pt2[1]
-    dist = sqrt((x2-x1)**2 + (y2-y1)**2)
-    return abs(dist)
-
-def my_round(x, base=1):
-    if base == 0:
-        return x
-    return base * round(x/base)
-        
-def contour_has_points(contour, point_coordinates):
-    for pt in contour.points:
-        if (pt.x, pt.y) in point_coordinates:
-            return True
-    return False
-    
-def average_coordinates(list_of_coords):
-    av_x = sum([x for (x, y) in list_of_coords]) / len(list_of_coords)
-    av_y = sum([y for (x, y) in list_of_coords]) / len(list_of_coords)
-    return(av_x, av_y)
-
-def break_dict_into_pairs(selected_contours, dictionary):
-    if len(dictionary.keys()) % 2 == 0 and len(dictionary.keys()) >= 2:
-        coords = list(dictionary.keys())
-        coord_pairs = []
-        while len(coords) > 1:
-            # print("coords", coords)
-            two_noncontiguous = get_noncontiguous_near_coords(selected_contours, coords)
-            # print("two_noncontiguous", two_noncontiguous)
-            if two_noncontiguous not in coord_pairs:
-                coord_pairs.append(two_noncontiguous)
-                
-                for noncontig_coord in tuple(two_noncontiguous):
-                    # print()
-                    # print("assessing whether", noncontig_coord, "is in", coords)
-                    if noncontig_coord in coords:    
-                        # print("removing", noncontig_coord)
-                        # print()
-                        coords.remove(noncontig_coord)
-                    else:
-                        print("Overlapper Error: (coord_pairs)", coord_pairs)
-        # print("(coord_pairs)", coord_pairs)
-        # Rebuild mini pair dictionaries
-        pair_dicts = []
-        for pair in coord_pairs:
-            # print("len(pair)", len(pair))
-            if len(pair) == 2:
-                new_dict = {pair[0]: dictionary[pair[0]], pair[1]: dictionary[pair[1]]}
-                pair_dicts.append(new_dict)
-        return pair_dicts
-    else:
-        return [dictionary]
-        
-def add_contour_to_end(g, contour_a, contour_b):
-    '''Adds one contour to another'''
-    deleted = False
-    b_copy = contour_b.copy()
-    g.removeContour(contour_b)
-    for pt in b_copy.points:
-        if pt.type == 'move':
-            contour_a.appendPoint(
-                (pt.x, pt.y), 'line', pt.smooth, pt.name, pt.identifier)
-        else:
-            contour_a.appendPoint(
-                (pt.x, pt.y), pt.type, pt.smooth, pt.name, pt.identifier)
-    
-def close_contour_at_coords(g, list_of_two_coords):
-    points = []
-    contours = []
-    for contour in g:
-        for pt in contour.points:
-            if (pt.x, pt.y) in list_of_two_coords:
-                points.append(pt)
-                if pt.contour not in contours:
-                    # Make sure the one with point index `0` is the second one
-                    if pt.type != 'move':                        
-                        contours.insert(0, pt.contour)
-                    else:
-                        contours.append(pt.contour)
-    if DEBUG == True: print(contours)
-    # If it's the same contour, just close it.
-    if len(contours) == 1:
-        for contour in g:
-            for pt in contour.points:
-                if (pt.x, pt.y) in list_of_two_coords:
-                    if pt.type == 'move': pt.type = 'line'
-    else:
-        try:
-            add_contour_to_end(g, contours[0], contours[1])
-        # Open contours, or outside corners of contour that doesn't overlap with others.
-        except IndexError:
-            pass
-            
-def get_closest_two_coords(list_of_coordinates):
-    closest_dist = 0
-    closest_coords = []
-    for coord in list_of_coordinates:
-        for coord_2 in list_of_coordinates:
-            dist = get_vector_distance(coord, coord_2)
-            if dist != 0 and (dist < closest_dist or closest_dist == 0):
-                closest_dist = dist
-                closest_coords = [coord, coord_2]
-    return closest_coords
-    
-def get_noncontiguous_near_coords(selected_contours, list_of_coordinates):
-    # Based on indexes
-    # print("list_of_coordinates", list_of_coordinates)
-    if len(list_of_coordinates) <= 2:
-        return tuple(list_of_coordinates)
-    coord_pair = []
-    coord_candidates = []
-    index = None
-    base_contour = None
-    for c in selected_contours:
-        for pt in c.points:
-            if (pt.x, pt.y) in list_of_coordinates:
-                if index == None: 
-                    # print("step 1", (pt.x, pt.y))
-                    if (pt.x, pt.y) in coord_pair:
-                        # print("continuing")
-                        continue
-                    coord_pair.append((pt.x, pt.y))
-                    index = pt.index
-                    base_contour = pt.contour
-                else:
-                    # print("step 2", (pt.x, pt.y))
-                    if pt.contour != base_contour:
-                        coord_candidates.append((pt.x, pt.y))
-                    if abs(pt.index - index) > 1:
-                        coord_candidates.append((pt.x, pt.y))
-    # print("coord_candidates", coord_candidates)
-    coord_pair = tuple(get_closest_two_coords(coord_pair + coord_candidates))
-    return coord_pair
-                
-def average_point_pos(point_to_move, other_point_coords):
-    point_to_move.x = (point_to_move.x + other_point_coords[0])/2
-    point_to_move.y = (point_to_move.y + other_point_coords[1])/2
-    
-def check_continuous(list_of_coords, tol=0.1):
-    try:
-        (min_x, min_y), (max_x, max_y) = min(list_of_coords), max(list_of_coords)
-    except ValueError:  # Not sure why this is necessary. Catches empty lists, assumes not continuous.
-        return False
-    if list_of_coords[1][0] == list_of_coords[0][0]:
-        general_angle = 0.7853981633974483  # 90 degrees
-    else:
-        # Choose first pair of coords to set the standard for angle
-        general_angle = atan((list_of_coords[1][1] - list_of_coords[0][1])/(list_of_coords[1][0] - list_of_coords[0][0]))
-    for i, coord in enumerate(list_of_coords):
-        if (coord[0] - list_of_coords[i-1][0]) == 0:
-            local_angle = 0.7853981633974483
+    if not SETTINGS:
+        load_settings()
+    return SETTINGS[setting]
+
+
+# Timings get written here after each gesture, when "Record timings" is on in the settings.
+TRACE_FOLDER = '~/Library/Logs/Overlapper'
+
+def set_up_tracer():
+    tracer.echo = DEBUG
+    tracer.enabled = DEBUG or bool(get_setting_from_defaults('traceTimings'))
+
+
+class PreviewScheduler:
+    '''
+    Coalesces redraw requests. Draws at most `frame_rate` times a second, always
+    for the latest request, and not at all if the requested state (e.g. the
+    tool value) is the same as the one that was last drawn.
+    '''
+
+    def __init__(self, draw_callback, frame_rate=60):
+        self.draw_callback = draw_callback
+        self.frame_rate = frame_rate
+        self.timer = None
+        self.reset()
+
+    def reset(self):
+        self.cancel()
+        self.pending_state = None
+        self.drawn_state = None
+        self.last_draw_time = 0
+        # For the drag summary: requests that came in, frames drawn, requests replaced by a newer one
+        # before their frame came, and frames skipped because nothing had changed.
+        self.request_count = 0
+        self.frame_count = 0
+        self.coalesced_count = 0
+        self.skipped_count = 0
+
+    def cancel(self):
+        if self.timer is not None:
+            self.timer.invalidate()
+            self.timer = None
+
+    def request(self, state):
+        self.request_count += 1
+        if self.pending_state is not None:
+            self.coalesced_count += 1
+        self.pending_state = state
+        if self.timer is not None:
+            # A frame is already on its way, and will draw this state instead.
+            return
+        wait = self.last_draw_time + 1 / max(1, self.frame_rate) - time.perf_counter()
+        if wait <= 0:
+            self.draw()
         else:
-            local_angle = atan((coord[1] - list_of_coords[i-1][1])/(coord[0] - list_of_coords[i-1][0]))
-        if local_angle < general_angle - tol or local_angle > general_angle + tol:
-            return False
-    return True
-    
-def search_continuity(glyph, pair_of_points):
-    for c in glyph.contours:
-        # Get the indexes of our central pair of points
-        indexes_to_analyze = []
-        for pt in c.points:
-            if (pt.x, pt.y) in pair_of_points:
-                indexes_to_analyze.append(pt.index)
-        # Add contiguous points to the search
-        new_indexes_to_analyze = []
-        for i in indexes_to_analyze:
-            new_indexes_to_analyze.append(i)
-            if i + 1 not in new_indexes_to_analyze and i + 1 < len(c.points):
-                new_indexes_to_analyze.append(i + 1)
-            if i - 1 not in new_indexes_to_analyze:
-                if i - 1 == -1:
-                    new_indexes_to_analyze.append(len(c.points) - 1)
-                else:
-                    new_indexes_to_analyze.append(i - 1)
-        # Check if the coordinates of the four points segment runs along the same line
-        coords_to_analyze = [(pt.x, pt.y) for pt in c.points if pt.index in new_indexes_to_analyze]
-        if check_continuous(coords_to_analyze) == True:
-            return True
-    return False
+            self.timer = AppKit.NSTimer.scheduledTimerWithTimeInterval_repeats_block_(wait, False, self.timer_fired)
+
+    def timer_fired(self, timer):
+        self.timer = None
+        self.draw()
+
+    def flush(self):
+        '''Draws a pending request right away.'''
+        if self.timer is not None:
+            self.cancel()
+            self.draw()
+
+    def draw(self):
+        state, self.pending_state = self.pending_state, None
+        if state is None:
+            return
+        if state == self.drawn_state:
+            self.skipped_count += 1
+            return
+        self.frame_count += 1
+        self.drawn_state = state
+        self.last_draw_time = time.perf_counter()
+        self.draw_callback()
+
+
+class FrameCache:
+    '''A small least-recently-used cache of finished preview frames, kept for one drag.'''
+
+    def __init__(self, size=64):
+        self.size = size
+        self.frames = OrderedDict()
+
+    def get(self, key):
+        frame = self.frames.get(key)
+        if frame is not None:
+            self.frames.move_to_end(key)
+        return frame
+
+    def set(self, key, frame):
+        self.frames[key] = frame
+        self.frames.move_to_end(key)
+        while len(self.frames) > self.size:
+            self.frames.popitem(last=False)
+
+    def clear(self):
+        self.frames.clear()
+
+
+def get_contours_path(contours):
+    '''
+    A CGPath of engine contours, drawn straight from their points. The preview
+    only needs it for one frame, so it skips building an RGlyph and asking it
+    for its "merz.CGPath" representation.
+    '''
+    path = CGPathCreateMutable()
+    for c in contours:
+        points = c.points
+        # Closed contours can start with off-curves; the path starts at the first on-curve.
+        start = next((i for i, pt in enumerate(points) if pt.type != 'offcurve'), None)
+        if start is None:
+            continue
+        closed = not c.open
+        CGPathMoveToPoint(path, None, points[start].x, points[start].y)
+        # Closed contours go all the way around, back to where they started.
+        end = start + len(points) + 1 if closed else len(points)
+        offcurves = []
+        for i in range(start + 1, end):
+            pt = points[i % len(points)]
+            if pt.type == 'offcurve':
+                offcurves.append((pt.x, pt.y))
+                continue
+            if not offcurves:
+                CGPathAddLineToPoint(path, None, pt.x, pt.y)
+            elif pt.type == 'qcurve' or len(offcurves) == 1:
+                for (cx, cy), (x, y) in decomposeQuadraticSegment(offcurves + [(pt.x, pt.y)]):
+                    CGPathAddQuadCurveToPoint(path, None, cx, cy, x, y)
+            else:
+                for (c1x, c1y), (c2x, c2y), (x, y) in decomposeSuperBezierSegment(offcurves + [(pt.x, pt.y)]):
+                    CGPathAddCurveToPoint(path, None, c1x, c1y, c2x, c2y, x, y)
+            offcurves = []
+        if closed:
+            CGPathCloseSubpath(path)
+    return path
+
+
+def get_percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+class DragStats:
+    '''How long the frames of one drag (hotkey down to up) took to compute and to draw.'''
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.start_time = time.perf_counter()
+        self.compute_times = []
+        self.draw_times = []
+        self.cached_count = 0
+
+    def add_frame(self, compute_ns, draw_ns, cached=False):
+        self.compute_times.append(compute_ns / 1e6)
+        self.draw_times.append(draw_ns / 1e6)
+        if cached:
+            self.cached_count += 1
+
+    def get_summary(self, scheduler):
+        compute_times, draw_times = sorted(self.compute_times), sorted(self.draw_times)
+        return {
+            'duration': time.perf_counter() - self.start_time,
+            'frames': scheduler.frame_count,
+            'requests': scheduler.request_count,
+            'coalescedFrames': scheduler.coalesced_count,
+            'skippedFrames': scheduler.skipped_count,
+            'cachedFrames': self.cached_count,
+            'computeMedian': get_percentile(compute_times, 0.5),
+            'computeP99': get_percentile(compute_times, 0.99),
+            'drawMedian': get_percentile(draw_times, 0.5),
+            'drawP99': get_percentile(draw_times, 0.99),
+            }
 
 # ======================================================================================
 
@@ -253,9 +234,15 @@ class Overlapper(Subscriber):
         self.mod_active = False
         self.g = None
         self.cross_success = False
-
-        self.hotkey = get_setting_from_defaults('hotkey')
-        self.snap  = getDefault("glyphViewRoundValues")  # Expensing up top to add performance, but if snapping value is changed mid-session, RF will need restart for this to take effect on Overlapper
+        self.hold_contours = None
+        self.hold_cross = False
+
+        # Mouse moves can come in faster than the preview can be drawn, so they're coalesced into frames.
+        self.preview_scheduler = PreviewScheduler(self.draw_frame)
+        self.apply_settings()
+        # Dragging back and forth revisits the same tool values, so finished frames are kept until key up.
+        self.frame_cache = FrameCache()
+        self.drag_stats = DragStats()
         
         self.glyph_editor = self.getGlyphEditor()
         self.bg_container = self.glyph_editor.extensionContainer(
@@ -294,7 +281,24 @@ class Overlapper(Subscriber):
             offset=(0,-40)
             )
         self.info.setFigureStyle('tabular')
-        self.set_colors()  # Set the correct colors for outline and text (light or dark mode), at least upon load. Will set again later on.
+        self.load_preferences()  # Snapping, and the correct colors for outline and text (light or dark mode). Read again whenever they change.
+
+
+    def apply_settings(self):
+        self.hotkey = get_setting_from_defaults('hotkey')
+        self.pairing = PAIRING_MODES[get_setting_from_defaults('crossPairing')]
+        self.sync_mode = SYNC_MODES[get_setting_from_defaults('syncMasters')]
+        frame_rate = get_setting_from_defaults('frameRate')
+        # An emptied Frame rate field comes back as None (or 0), which would stop the preview.
+        if not isinstance(frame_rate, (int, float)) or frame_rate <= 0:
+            frame_rate = DEFAULT_SETTINGS['frameRate']
+        self.preview_scheduler.frame_rate = frame_rate
+        set_up_tracer()
+
+
+    def overlapperSettingsDidChange(self, info):
+        load_settings()
+        self.apply_settings()
 
 
     def start_with_oncurve(self, contour):
@@ -319,109 +323,52 @@ class Overlapper(Subscriber):
                     if pt.type == sel_pt.type and (pt.x, pt.y) == (sel_pt.x, sel_pt.y):
                         pt.selected = True
 
-    @timeit
-    def get_selection_data(self, offset):
-        self.g = CurrentGlyph()
+    def prepare_selection(self):
+        '''Reads the selected contours into the engine, and measures their selected corners, once per key press.'''
+        self.work_contours = engine.read_contours(self.sel_contours)
         sel_points = []
-        for c in self.g.contours:
-            sel_points += list(c.selectedPoints)
+        for c, work_c in zip(self.sel_contours, self.work_contours):
+            for pt, work_pt in zip(c.points, work_c.points):
+                if pt.selected:
+                    sel_points.append(work_pt)
         if DEBUG == True: print(sel_points)
-
-        sel_hubs = {}
-        new_sel_hubs_in = {}
-        new_sel_hubs_out = {}
-        for c in self.g.contours:
-            for i, seg in enumerate(c.segments):
-        
-                # Try to associate selected points with their respective segments
-                for pt in sel_points:
-                    if pt in seg.points:
-                    
-                        # Get inbound curve information for selected point
-                        try:
-                            seg_before = c.segments[i-1]
-                        except IndexError:
-                            seg_before = c.segments[-1]
-
-                        onC_before = seg_before.points[-1]
-                        if len(seg.points) == 3:
-                            onC_here = seg.points[2]
-                            sel_hubs.update({(onC_here.x, onC_here.y): {"in": [onC_before, seg.points[0], seg.points[1], onC_here]}})
-                            in_dist = approximateCubicArcLength((onC_before.x, onC_before.y), (seg.points[0].x, seg.points[0].y), (seg.points[1].x, seg.points[1].y), (onC_here.x, onC_here.y))
-                            if DEBUG == True: print("arc in_dist", in_dist)
-                        else:
-                            onC_here = seg.points[0]
-                            sel_hubs.update({(onC_here.x, onC_here.y): {"in": [onC_before, onC_here]}})
-                            in_dist = get_vector_distance(onC_here, onC_before)
-                            if DEBUG == True: print("line in_dist", in_dist)
-                        
-                        # Get outbound curve information for selected point
-                        try:
-                            seg_after = c.segments[i+1]
-                            onC_after = seg_after.points[-1]
-                        except IndexError:
-                            seg_after = c.segments[0]
-                        if DEBUG == True: print("seg_before:", seg_before, "\tseg_after:", seg_after)
-
-                        onC_after = seg_after.points[-1]
-
-                        if len(seg_after.points) == 3:
-                            sel_hubs[(onC_here.x, onC_here.y)].update({"out": [onC_here, seg_after.points[0], seg_after.points[1], onC_after]})
-                            out_dist = approximateCubicArcLength((onC_here.x, onC_here.y), (seg_after.points[0].x, seg_after.points[0].y), (seg_after.points[1].x, seg_after.points[1].y), (onC_after.x, onC_after.y))
-                            if DEBUG == True: print("arc out_dist", out_dist)
-                        else:
-                            sel_hubs[(onC_here.x, onC_here.y)].update({"out": [onC_here, onC_after]})
-                            out_dist = get_vector_distance(onC_here, onC_after)
-                            if DEBUG == True: print("line out_dist", out_dist)
-
-                        in_factor = (float(offset) + float(in_dist)) / float(in_dist)
-                        out_factor = (float(offset) + float(out_dist)) / float(out_dist)
-
-                        if DEBUG == True:
-                            print("in_factor", in_factor)
-                            print("out_factor", out_factor)
-                            print("sel_hubs", sel_hubs)
-                        
-                        # Start building output
-                        key = (onC_here.x, onC_here.y)
-                        _in = sel_hubs[key]["in"]
-                        _out = sel_hubs[key]["out"]
-                    
-                        in_args = []
-                        for i in range(len(_in)):
-                            in_args.append((_in[i].x, _in[i].y))
-                        
-                        out_args = []
-                        for i in range(len(_out)):
-                            out_args.append((_out[i].x, _out[i].y))
-
-                        if DEBUG == True: print("in_args, out_args", in_args, out_args)
-
-                        if len(in_args) == 4:
-                            in_result = splitCubicAtT(in_args[0], in_args[1], in_args[2], in_args[3], in_factor)[0]
-                            self.has_curve.append(in_result)
-                        else:
-                            in_result = lengthen_line(in_args[0], in_args[1], in_factor, "in")
-                        
-                        if len(out_args) == 4:
-                            out_result = splitCubicAtT(out_args[0], out_args[1], out_args[2], out_args[3], -(out_factor-1))[1]
-                            self.has_curve.append(out_result)
-                        else:
-                            out_result = lengthen_line(out_args[0], out_args[1], -(out_factor-1), "out")
-                                
-                        new_sel_hubs_in.update({key: in_result})
-                        new_sel_hubs_out.update({key: out_result})
-
-        # self.has_curve = [item for result in self.has_curve for item in result]
-        if DEBUG == True: 
-            print(self.has_curve)
-            print("new_sel_hubs_in", new_sel_hubs_in, "new_sel_hubs_out", new_sel_hubs_out)
-        return (new_sel_hubs_in, new_sel_hubs_out)
+        # Kept for the other masters, which get the same corners on commit.
+        self.sel_points = sel_points
+        self.selection_index = engine.get_selection_index(self.work_contours, sel_points)
+        self.corners = engine.batch_corners(engine.get_corners(self.selection_index))
+        # The overlapped preview is set up once. After that, only the points around the corners move.
+        self.preview = engine.OverlapPreview(self.work_contours, self.corners)
+        self.preview_g = None
+        # The engine contours of the latest frame, and whether they were cross-overlapped. These are what get committed.
+        self.hold_contours = None
+        self.hold_cross = False
+
+    @tracer.span()
+    def get_selection_data(self, offset):
+        # The source geometry doesn't change while the hotkey is held, so only the offset is new here.
+        return engine.extend_corners(self.corners, offset)
 
 
-    @timeit
+    @tracer.span()
     def draw_overlap_preview(self):
-        outline = self.get_overlapped_glyph()
+        compute_start = time.perf_counter_ns()
+        frame_key = (self.tool_value, self.shift_down)
+        frame = self.frame_cache.get(frame_key)
+        if frame is None:
+            outline = self.get_overlapped_glyph()
+            glyph_path = get_contours_path(self.hold_contours)
+            # The incremental preview glyph gets reused, so remember where its moving points were.
+            moving_coords = None
+            if outline is self.preview_g:
+                moving_coords = [(pt.x, pt.y) for pt, work_pt in self.preview_moving_points]
+            self.frame_cache.set(frame_key, (outline, glyph_path, self.cross_success, self.hold_contours, self.hold_cross, moving_coords))
+        else:
+            outline, glyph_path, self.cross_success, self.hold_contours, self.hold_cross, moving_coords = frame
+            if moving_coords is not None:
+                for (pt, work_pt), (x, y) in zip(self.preview_moving_points, moving_coords):
+                    pt.x, pt.y = work_pt.x, work_pt.y = x, y
+                outline.changed()
+            self.hold_g = outline
 
         if DEBUG == True: 
             for c_i in range(len(outline.contours)):
@@ -434,204 +381,180 @@ class Overlapper(Subscriber):
                         for pt in seg.points:
                             print(pt, pt.type, pt.index)
 
-        glyph_path = outline.getRepresentation("merz.CGPath")
+        draw_start = time.perf_counter_ns()
         self.stroked_preview.setPath(glyph_path)
         self.preview_preview.setPath(glyph_path)
         
         postEvent(f"{EXTENSION_KEY}.overlapperDidDraw", overlapGlyph=outline, strokeColor=self.color)
+        self.drag_stats.add_frame(draw_start - compute_start, time.perf_counter_ns() - draw_start, cached=frame is not None)
 
         
-    @timeit
+    @tracer.span()
     def get_overlapped_glyph(self):
         in_result, out_result = self.get_selection_data(self.tool_value)
 
-        self.hold_g = RGlyph()
-        pen = self.hold_g.getPointPen()
-        for c in self.sel_contours:
-            c.drawPoints(pen)
-            
-        for c in self.hold_g:
-            hits = 0  # How many points you've gone through in the loop that are selected. this will bump up the index # assigned to newly created segments
-            for i, seg in enumerate(c.segments):
-                if c.open: i = i-1  # Not sure why, but shifting segment index is what makes non-closed contours behave as expected
-                x, y = seg.onCurve.x, seg.onCurve.y
-                next_x, next_y = None, None
-                if (x, y) in in_result.keys():
-                    if len(seg.points) == 3:
-                        seg.offCurve[0].x, seg.offCurve[0].y = in_result[(x, y)][-3][0], in_result[(x, y)][-3][1]
-                        seg.offCurve[1].x, seg.offCurve[1].y = in_result[(x, y)][-2][0], in_result[(x, y)][-2][1]
-                    else:
-                        if DEBUG == True: print("a")
-                        pass
-                    seg.onCurve.x, seg.onCurve.y = in_result[(x, y)][-1][0], in_result[(x, y)][-1][1]
-                    
-                    if DEBUG == True: 
-                        print("hits", hits)
-                        print("UNIQUE XY", (x,y))
-                        print("len(c.segments)", len(c.segments))
-                        print("i", i)
-                        print("in_result, out_result", in_result, out_result)
-                        print("len(in_result)", len(in_result))
-
-                    # Add a gap, special case if starting over on the contour
-                    if i + 1 == len(c.segments) - hits:
-                        if DEBUG == True: print("1", "this is the end of the contour", "should be putting a point at the 0 index of: ",  out_result[(x, y)])
-                        c.segments[-1].smooth = False  # Make sure the current segment doesn't maintain smooth; it's now a corner.
-                        c.insertSegment(0, type="line", points=[out_result[(x, y)][0]], smooth=False)
-                        next_seg = c.segments[1]
-                    else:
-                        if DEBUG == True: print("2")
-                        c.segments[i + hits].smooth = False  # Make sure the current segment doesn't maintain smooth; it's now a corner.
-                        c.insertSegment(i + 1 + hits, type="line", points=[out_result[(x, y)][0]], smooth=False)
-                        try:
-                            if DEBUG == True: print("2a")
-                            next_seg = c.segments[i + 2 + hits]
-                            if c.open: next_seg = c.segments[i + 3 + hits]  # Again, not sure why this helps open contours.
-                        except IndexError:
-                            if DEBUG == True: print("2b")
-                            next_seg = c.segments[0]
-
-                    # Onto the next segment, change the point positions                 
-                    if len(next_seg.points) == 3:
-                        if DEBUG == True: print("3", "len(seg), len(next_seg)", len(seg), len(next_seg))
-                        next_seg.offCurve[0].x, next_seg.offCurve[0].y = out_result[(x, y)][-3][0], out_result[(x, y)][-3][1]
-                        next_seg.offCurve[1].x, next_seg.offCurve[1].y = out_result[(x, y)][-2][0], out_result[(x, y)][-2][1]
-                    else:
-                        if DEBUG == True: print("4")
-                        pass
-                    # Should all do this ???:  next_seg.onCurve.x, y?? THIS MIGHT NOT BE NECESSARY, because it's just describing the next point
-                    next_x, next_y = out_result[(x, y)][-1][0], out_result[(x, y)][-1][1]
-                    if DEBUG == True: print("5", "len(seg), len(next_seg)", len(seg), len(next_seg))
-
-                    # You just went through and added another point, so prepare to bump up the index one more than previously assumed
-                    hits += 1
-        
-        # Cross-Overlap feature
-        # Make a list of all of the coordinates of the resulting overlapped points.
-        sel_points_amount = len(in_result.keys())
+        # Cross-Overlap feature. It changes the structure of the contours, so it's rebuilt every time.
         if self.shift_down:
-            base_and_results = {}
-            for key, val_in in in_result.items():
-                base_and_results[key] = {'in': [], 'out': []}
-                val_in = val_in[-1]
-                if not val_in == key:
-                    base_and_results[key]['in'] = val_in
-                val_out = out_result[key][0]
-                if not val_out == key:
-                    base_and_results[key]['out'] = val_out
-            if sel_points_amount % 2 == 0:
-                for b_and_r_pair in break_dict_into_pairs(self.sel_contours, base_and_results):
-                    self.convert_overlaps_to_cross_overlap(self.hold_g, b_and_r_pair)
-            
+            contours = [engine.overlap_contour(c, in_result, out_result) for c in self.work_contours]
+            self.cross_success = engine.cross_overlap(self.work_contours, contours, in_result, out_result, self.pairing)
+            self.hold_contours = contours
+            self.hold_cross = True
+            # The glyph is just for showing; it's the contours that get committed.
+            self.hold_g = RGlyph()
+            engine.draw_contours(contours, self.hold_g.getPointPen())
+            return self.hold_g
+
+        self.preview.update(in_result, out_result)
+        self.hold_contours = self.preview.contours
+        self.hold_cross = False
+        if self.preview_g is None:
+            self.preview_g = RGlyph()
+            engine.draw_contours(self.preview.contours, self.preview_g.getPointPen())
+            # Hold on to the glyph's points that will move, so the rest can be left alone.
+            self.preview_moving_points = []
+            for c, work_c in zip(self.preview_g.contours, self.preview.contours):
+                for pt, work_pt in zip(c.points, work_c.points):
+                    if work_pt in self.preview.moving_points:
+                        self.preview_moving_points.append((pt, work_pt))
+        else:
+            for pt, work_pt in self.preview_moving_points:
+                pt.x, pt.y = work_pt.x, work_pt.y
+            self.preview_g.changed()
+        self.hold_g = self.preview_g
         return self.hold_g
         
     
-    @timeit
+    @tracer.span()
     def overlap_it(self):
+        if self.hold_contours is None:
+            return
         with self.g.undo("Overlap"):
             try:
+                new_contours = self.hold_contours
+                is_preview = new_contours is self.preview.contours
                 if self.snap != 0:
-                    for c in self.hold_g.contours:
-                        for pt in c.points:
-                            pt.x, pt.y = my_round(pt.x, self.snap), my_round(pt.y,  self.snap)
+                    # Only the points that moved need snapping. The rest are right where they were in the glyph.
+                    if is_preview:
+                        moved_points = list(self.preview.moving_points)
+                    else:
+                        original_coords = {pt.coords for c in self.work_contours for pt in c.points}
+                        moved_points = [pt for c in new_contours for pt in c.points if pt.coords not in original_coords]
+                    snapped = engine.snap_coordinates([(pt.x, pt.y) for pt in moved_points], self.snap)
+                    for pt, (x, y) in zip(moved_points, snapped):
+                        pt.x, pt.y = x, y
                             
+                # Only the contours that changed are swapped out, in place. The rest of the glyph is left alone.
+                sel_indexes = [contour.index for contour in self.sel_contours]
+                if is_preview:
+                    placements = [
+                        [contour] if i in self.preview.changed_contours else None
+                        for i, contour in enumerate(new_contours)
+                        ]
+                else:
+                    placements = self.get_placements(sel_indexes, new_contours)
                 with self.g.holdChanges():
-                    compile_g = RGlyph()
-                    excess_contours = len(self.hold_g) - len(self.sel_contours)
-                    hold_g_index = 0
-                    for contour in self.g.contours:
-                        if not contour in self.sel_contours:
-                            contours_to_add = [contour]
-                        else:
-                            if excess_contours >= 0:
-                                contour = self.hold_g[hold_g_index]
-                                contours_to_add = [contour] 
-                                hold_g_index += 1
-                                while excess_contours > 0:
-                                    contour = self.hold_g[hold_g_index]
-                                    contours_to_add.append(contour)  
-                                    hold_g_index += 1
-                                    excess_contours -= 1 
-                            # Negative excess contours are caused by Overlapper making two into one.
-                            else:
-                                contours_to_add = []
-                                excess_contours += 1
-                        for c in contours_to_add:
-                            compile_g.appendContour(c)
-                
-                    self.g.clearContours()
-                    self.g.appendGlyph(compile_g)            
-                            
+                    self.place_contours(self.g, sel_indexes, placements)
+
                 # # Restore components
                 # for comp in self.stored_components:
                 #     self.g.appendComponent(component=comp)
                 self.g.changed()
             except Exception as error:
                 print(f"Overlapper Error. Reference: Overlap Commit\n{error}")
-                pass
-    
-    def convert_overlaps_to_cross_overlap(self, glyph, dpd):
-        # List of all 4 flattened resulting points
-        all_points = []
-        for key, val in dpd.items():
-            all_points += (val.values())
-            
-        # Break the contours
-        for c in glyph.contours:
-            for pt in c.points:
-                if (pt.x, pt.y) in all_points:
-                    if DEBUG == True: print("Breaking contour at", pt)
-                    c.breakContour(pt)
-                    
-        dict_keys = list(dpd.keys())   
-        # print("dpd", dpd)
-        pairs_to_close_or_remove = [[dpd[dict_keys[0]]['in'], dpd[dict_keys[1]]['out']], [dpd[dict_keys[1]]['in'], dpd[dict_keys[0]]['out']]]
-        
-        # Remove the short segments
-        for c in glyph.contours:
-            remove = True
-            if len(c.points) == 2:
-                for pt in c.points:                
-                    if (pt.x, pt.y) in all_points:
-                        continue
-                    else:
-                        remove = False
-                # Remove the short segment contour if both points’ coordinates are in the list of coordinates.
-                if remove == True:
-                    if DEBUG == True: print("Removing contour", c)
-                    # Add coordinates of points you're about to remove to a list of associated points.
-                    glyph.removeContour(c)
-        
-        # Close the gaps the opposite way.
-        for pair in pairs_to_close_or_remove:
-            close_contour_at_coords(glyph, pair)
-            close_contour_at_coords(glyph, pair)
-            
-                                
-        if DEBUG == True: print("self.has_curve", self.has_curve)
-        # Remove two points if there is no curve, and the four resulting points are along the same line
-        for pair in pairs_to_close_or_remove:
-            # Check to see if there's an off-curve in the pair first
-            if not (pt.x, pt.y) in self.has_curve:
-                # Check if the four-points segment runs along the same line
-                if search_continuity(glyph, pair) == True:
-                    # If so, remove the point
-                    for c in glyph:
-                        for pt in c.points:
-                            if (pt.x, pt.y) in pair:
-                                if DEBUG == True:
-                                    print("\n", (pt.x, pt.y), "Removing point. Note to self: check to make sure it's not an off-curve, so there's no illegal point count!")
-                                    print()
-                                if pt.type != 'offcurve':
-                                    c.removePoint(pt, preserveCurve=True)
-        self.cross_success = True
-                    
-    @timeit
+                return
+        if self.sync_mode is not None:
+            self.sync_masters(sel_indexes, new_contours)
+        else:
+            self.check_masters()
+
+    def get_placements(self, sel_indexes, new_contours):
+        '''Which of `new_contours` go where each of the contours at `sel_indexes` was, when there might be more or fewer of them.'''
+        placements = []
+        excess_contours = len(new_contours) - len(sel_indexes)
+        hold_g_index = 0
+        for index in sel_indexes:
+            if excess_contours >= 0:
+                contours_to_add = [new_contours[hold_g_index]]
+                hold_g_index += 1
+                while excess_contours > 0:
+                    contours_to_add.append(new_contours[hold_g_index])
+                    hold_g_index += 1
+                    excess_contours -= 1
+            # Negative excess contours are caused by Overlapper making two into one.
+            else:
+                contours_to_add = []
+                excess_contours += 1
+            placements.append(contours_to_add)
+        return placements
+
+    def place_contours(self, glyph, sel_indexes, placements):
+        # Back to front, so the indexes still to come stay put.
+        for index, contours_to_add in reversed(list(zip(sel_indexes, placements))):
+            if contours_to_add is not None:
+                self.replace_contour(glyph, index, contours_to_add)
+
+    def replace_contour(self, glyph, index, new_contours):
+        '''Swaps the contour at `index` for `new_contours`, keeping their contour and point identifiers.'''
+        glyph.removeContour(glyph[index])
+        pen = glyph.getPointPen()
+        for i, contour in enumerate(new_contours):
+            contour.drawPoints(pen)
+            glyph[len(glyph) - 1].index = index + i
+
+    def get_other_masters(self, sync_mode):
+        '''The same glyph in the other open fonts, or in the other layers of this one.'''
+        if sync_mode == 'fonts':
+            return [font[self.g.name] for font in AllFonts() if font != self.g.font and self.g.name in font]
+        if sync_mode == 'layers':
+            return [layer_glyph for layer_glyph in self.g.layers if layer_glyph.layer.name != self.g.layer.name]
+        return []
+
+    def check_masters(self):
+        '''Warns if the glyph was compatible with the same glyph in the other open fonts before this overlap, and isn’t anymore.'''
+        signature = engine.get_contour_signature(engine.read_contours(self.g))
+        if signature == self.start_signature:
+            return
+        broken = [glyph for glyph in self.get_other_masters('fonts') if engine.get_contour_signature(engine.read_contours(glyph)) == self.start_signature]
+        if broken:
+            names = ", ".join(glyph.font.info.styleName or glyph.font.path or "Untitled" for glyph in broken)
+            print(f"Overlapper Warning. {self.g.name} isn’t compatible with these anymore: {names}. Set Masters in the settings to overlap them all at once.")
+
+    @tracer.span()
+    def sync_masters(self, sel_indexes, new_contours):
+        '''
+        Gives the other masters the overlap that was just committed: the same
+        corners by point index, with offsets in proportion to their segments,
+        cross-overlapped if the committed frame was (Shift might be up by now).
+        Masters whose result wouldn’t interpolate with this glyph are left alone.
+        '''
+        masters = []
+        for glyph in self.get_other_masters(self.sync_mode):
+            if len(glyph) > max(sel_indexes):
+                masters.append((glyph, engine.read_contours([glyph[index] for index in sel_indexes])))
+        if not masters:
+            return
+        results = engine.overlap_masters(self.work_contours, self.sel_points, self.tool_value, [master_contours for glyph, master_contours in masters], cross=self.hold_cross, pairing=self.pairing)
+        incompatible = set(engine.get_incompatible(new_contours, results))
+        for i, ((glyph, master_contours), master_new_contours) in enumerate(zip(masters, results)):
+            if i in incompatible:
+                continue
+            if self.snap != 0:
+                original_coords = {pt.coords for c in master_contours for pt in c.points}
+                moved_points = [pt for c in master_new_contours for pt in c.points if pt.coords not in original_coords]
+                for pt, (x, y) in zip(moved_points, engine.snap_coordinates([pt.coords for pt in moved_points], self.snap)):
+                    pt.x, pt.y = x, y
+            with glyph.undo("Overlap"):
+                with glyph.holdChanges():
+                    self.place_contours(glyph, sel_indexes, self.get_placements(sel_indexes, master_new_contours))
+                glyph.changed()
+        if incompatible:
+            names = ", ".join(f"{masters[i][0].font.info.styleName or masters[i][0].font.path} ({masters[i][0].layer.name})" for i in sorted(incompatible))
+            print(f"Overlapper Error. Reference: Sync Masters\nLeft alone, because they wouldn’t be compatible with {self.g.name}: {names}")
+
+    @tracer.span()
     def glyphEditorDidKeyDown(self, info):
         if DEBUG == True: print("glyphEditorDidKeyDown", info)
         
-        self.has_curve = []
-        
         # Check Shift modifier
         if info['deviceState']['shiftDown'] == 0:
             self.shift_down = False
@@ -640,7 +563,6 @@ class Overlapper(Subscriber):
             self.shift_down = True
 
         char = info['deviceState']['keyDownWithoutModifiers']
-        self.hotkey = get_setting_from_defaults('hotkey')
         if char.lower() == self.hotkey and self.mod_active == False:
             self.g = CurrentGlyph()
             self.sel_contours = self.g.selectedContours
@@ -653,6 +575,8 @@ class Overlapper(Subscriber):
 
             # Before we start, make sure the starting point is not an off-curve (that creates issues with segment insertion [illegal point counts])
             if self.allow_redraw == True:    
+                # Before anything moves, so start point fixes count as changes too (see `check_masters()`).
+                self.start_signature = engine.get_contour_signature(engine.read_contours(self.g))
                 changed = False
                 for contour in self.sel_contours:
                     first_point = contour.points[0]
@@ -665,13 +589,18 @@ class Overlapper(Subscriber):
                 if changed:
                     self.g.changed()
 
+                self.prepare_selection()
+                self.frame_cache.clear()
+                self.preview_scheduler.reset()
+                self.drag_stats.reset()
+
                 # Only do this once at the beginning 
                 self.allow_redraw  = False
 
             # Store the components, so we can delete them from the preview glyph and add them back upon commit.
             self.stored_components = self.g.components
 
-            self.draw_overlap_preview()
+            self.preview_scheduler.request((self.tool_value, self.shift_down))
             self.stroked_preview.setVisible(True)
             self.preview_preview.setVisible(True)
 
@@ -687,7 +616,12 @@ class Overlapper(Subscriber):
             self.key_down = False  # Don't need this?
 
             if self.ready_to_go == True:
+                # Make sure the latest tool value has been drawn before it's committed.
+                self.preview_scheduler.flush()
                 self.overlap_it()
+                postEvent(f"{EXTENSION_KEY}.overlapperDidFinishDrag", glyph=self.g, dragSummary=self.drag_stats.get_summary(self.preview_scheduler))
+            self.preview_scheduler.reset()
+            self.frame_cache.clear()
 
             self.initial_x = None
             self.tool_value = 0
@@ -697,6 +631,8 @@ class Overlapper(Subscriber):
             self.preview_preview.setVisible(False)
             
             postEvent(f"{EXTENSION_KEY}.overlapperDidStopDrawing")
+            if tracer.enabled:
+                tracer.export(TRACE_FOLDER)
 
             self.ready_for_init = True
             self.allow_redraw  = True
@@ -729,34 +665,50 @@ class Overlapper(Subscriber):
                 self.initial_y = int(y)
             self.current_x = int(x)
             self.tool_value = int((self.current_x - self.initial_x)/2)
-            
-            self.draw_overlap_preview()
 
-            # Draw info
             self.info.setVisible(True)
-            self.description = 'Overlapping'
-            if self.tool_value < 0:
-                self.description = 'Chamfering'
-            if self.shift_down and self.cross_success:
-                self.description = 'Cross-overlapping'
-            self.info.setText(f" ← {self.description} → \n{self.tool_value}")
             self.info.setPosition((self.initial_x, y))
+            self.preview_scheduler.request((self.tool_value, self.shift_down))
+
+
+    def draw_frame(self):
+        self.draw_overlap_preview()
+
+        # Draw info
+        self.description = 'Overlapping'
+        if self.tool_value < 0:
+            self.description = 'Chamfering'
+        if self.shift_down and self.cross_success:
+            self.description = 'Cross-overlapping'
+        self.info.setText(f" ← {self.description} → \n{self.tool_value}")
 
 
     # Change the UI colors if the app switches to dark mode.
     roboFontAppearanceChangedDelay = 1
     def roboFontAppearanceChanged(self, info):
-        self.set_colors()
+        self.load_preferences()
 
 
-    def set_colors(self):
+    # Same for any change in RoboFont's preferences, so snapping and colors are up to date without a restart.
+    roboFontDidChangePreferencesDelay = 0
+    def roboFontDidChangePreferences(self, info):
+        self.load_preferences()
+
+
+    def load_preferences(self):
+        # The only place preferences get read, so drawing and committing never have to.
+        self.snap = getDefault("glyphViewRoundValues")
         if version >= "4.4":
-            # Update, if you're in dark mode or not. This may be expensive—may want to perform in build().
+            # Depends on if you're in dark mode or not
             self.color = getDefault(appearanceColorKey('glyphViewStrokeColor'))
             self.preview_color = getDefault(appearanceColorKey('glyphViewPreviewFillColor'))
         else:
             self.color = getDefault('glyphViewStrokeColor')
             self.preview_color = getDefault('glyphViewPreviewFillColor')
+        self.set_colors()
+
+
+    def set_colors(self):
         self.stroked_preview.setStrokeColor(self.color)
         self.preview_preview.setFillColor(self.preview_color)
         self.info.setFillColor(self.color)
@@ -788,5 +740,27 @@ if __name__ == '__main__':
             documentation="Sent when Overlapper has stopped drawing.",
             delay=None
         )
+    # Register a subscriber event for the settings window applying changes
+    event_name = f"{EXTENSION_KEY}.overlapperSettingsDidChange"
+    if event_name not in getRegisteredSubscriberEvents():
+        registerSubscriberEvent(
+            subscriberEventName=event_name,
+            methodName="overlapperSettingsDidChange",
+            lowLevelEventNames=[event_name],
+            dispatcher="roboFont",
+            documentation="Sent when Overlapper’s settings have been changed.",
+            delay=None
+        )
+    # Register a subscriber event for the end of each drag, with how responsive it was
+    event_name = f"{EXTENSION_KEY}.overlapperDidFinishDrag"
+    if event_name not in getRegisteredSubscriberEvents():
+        registerSubscriberEvent(
+            subscriberEventName=event_name,
+            methodName="overlapperDidFinishDrag",
+            lowLevelEventNames=[event_name],
+            dispatcher="roboFont",
+            documentation="Sent when an Overlapper drag is committed. `dragSummary` has its frame count, coalesced and skipped frames, and median and p99 compute and draw times (in ms).",
+            delay=None
+        )
     registerGlyphEditorSubscriber(Overlapper)
 
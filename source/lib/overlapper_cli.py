@@ -0,0 +1,290 @@
+'''
+Overlapper, from the command line.
+
+Overlaps (or chamfers, with a negative value) every corner that matches the
+given rules, across whole UFOs or every source of a designspace, and writes
+the changed glyphs back in place. For example:
+
+    python overlapper_cli.py MyFont-Bold.ufo --value 20 --point-name overlap
+    python overlapper_cli.py MyFamily.designspace --value -8 --glyphs A V W --max-angle 100
+
+Glyphs are the unit of work: they’re spread across a pool of processes
+(one per core, unless `--jobs` says otherwise), and each changed .glif is
+written by the process that overlapped it.
+
+With `--sync`, the sources of each designspace are overlapped together, as
+masters: the rules pick corners in the first source only, and every other
+source gets the same corners (by point index) with offsets in proportion to
+its segments. A glyph is only written if all of its masters stay compatible.
+'''
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from fontTools.ufoLib import UFOReader
+from fontTools.ufoLib.glifLib import GlyphSet
+from fontTools.designspaceLib import DesignSpaceDocument
+import overlapper_engine as engine
+
+
+class GlyphData:
+    '''Holds whatever `readGlyph` sets on it (width, unicodes, anchors...), so it can be written back untouched.'''
+
+
+def get_sources(path):
+    '''Returns a list of (UFO path, layer name) to work on. A layer name of None means the default layer.'''
+    if path.endswith('.designspace'):
+        doc = DesignSpaceDocument.fromfile(path)
+        sources = []
+        for source in doc.sources:
+            if (source.path, source.layerName) not in sources:
+                sources.append((source.path, source.layerName))
+        return sources
+    return [(path, None)]
+
+def select_corners(contours, point_names=None, point_types=None, max_angle=None, include_smooth=False):
+    '''
+    Returns the on-curve points of `contours` that match all of the given
+    rules. Smooth points aren’t corners, so they’re left out unless `include_smooth`.
+    '''
+    selected = []
+    for c in contours:
+        for pt_index, pt in enumerate(c.points):
+            if pt.type in ('offcurve', 'move'):
+                continue
+            if pt.smooth and not include_smooth:
+                continue
+            if point_names and pt.name not in point_names:
+                continue
+            if point_types and pt.type not in point_types:
+                continue
+            if max_angle is not None and engine.get_corner_angle(c, pt_index) > max_angle:
+                continue
+            selected.append(pt)
+    return selected
+
+def read_glyph(glyph_set, glyph_name):
+    '''Returns the glyph’s data and a pen holding its contours and components.'''
+    glyph = GlyphData()
+    pen = engine.ContourPointPen()
+    glyph_set.readGlyph(glyph_name, glyph, pen)
+    return glyph, pen
+
+def snap_moved_points(original_contours, contours, snap=1):
+    '''Rounds the points of `contours` that the overlap moved or added to the `snap` grid. The rest stay exactly where they were.'''
+    if snap == 0:
+        return
+    original_coords = {pt.coords for c in original_contours for pt in c.points}
+    moved_points = [pt for c in contours for pt in c.points if pt.coords not in original_coords]
+    for pt, (x, y) in zip(moved_points, engine.snap_coordinates([pt.coords for pt in moved_points], snap)):
+        pt.x, pt.y = x, y
+
+def contours_differ(original_contours, contours):
+    '''Whether overlapping changed anything. Corners can get dropped (open contour ends, stacked points), leaving nothing to do.'''
+    def get_outline(contours):
+        return [[(pt.x, pt.y, pt.type) for pt in c.points] for c in contours]
+    return get_outline(original_contours) != get_outline(contours)
+
+def write_glyph(glyph_set, glyph_name, glyph, pen, contours):
+    '''Writes `contours` in place of the ones in `pen`, keeping the components.'''
+    def draw_points(point_pen):
+        engine.draw_contours(contours, point_pen)
+        for base_glyph, transformation, identifier in pen.components:
+            point_pen.addComponent(base_glyph, transformation, identifier=identifier)
+
+    glyph_set.writeGlyph(glyph_name, glyph, draw_points)
+
+def overlap_glyph(glyph_set, glyph_name, value, rules, cross=False, pairing='nearest', snap=1, dry_run=False):
+    '''Overlaps one glyph of `glyph_set`, and writes it back if anything changed. Returns whether it changed.'''
+    glyph, pen = read_glyph(glyph_set, glyph_name)
+    selected = select_corners(pen.contours, **rules)
+    if not selected:
+        return False
+    contours, _ = engine.overlap_contours(pen.contours, selected, value, cross=cross, pairing=pairing)
+    snap_moved_points(pen.contours, contours, snap)
+    if not contours_differ(pen.contours, contours):
+        return False
+    if not dry_run:
+        write_glyph(glyph_set, glyph_name, glyph, pen, contours)
+    return True
+
+def overlap_glyph_masters(glyph_sets, glyph_name, value, rules, cross=False, pairing='nearest', snap=1, dry_run=False):
+    '''
+    Overlaps one glyph across `glyph_sets` (one per master, the first being
+    the reference), see `engine.overlap_masters()`. Nothing is written unless
+    every master stays compatible. Returns whether each one changed.
+    '''
+    glyph_sets = [glyph_set if glyph_name in glyph_set else None for glyph_set in glyph_sets]
+    if glyph_sets[0] is None:
+        return [False] * len(glyph_sets)
+    masters = [read_glyph(glyph_set, glyph_name) if glyph_set is not None else None for glyph_set in glyph_sets]
+    reference_glyph, reference_pen = masters[0]
+    selected = select_corners(reference_pen.contours, **rules)
+    if not selected:
+        return [False] * len(glyph_sets)
+    contours, _ = engine.overlap_contours(reference_pen.contours, selected, value, cross=cross, pairing=pairing)
+    others = [master for master in masters[1:] if master is not None]
+    results = engine.overlap_masters(reference_pen.contours, selected, value, [pen.contours for glyph, pen in others], cross=cross, pairing=pairing)
+    if engine.get_incompatible(contours, results):
+        print(f"{glyph_name}: left alone, because its masters wouldn’t be compatible")
+        return [False] * len(glyph_sets)
+    results = iter([contours] + results)
+    changed = []
+    for glyph_set, master in zip(glyph_sets, masters):
+        if master is None:
+            changed.append(False)
+            continue
+        master_contours = next(results)
+        glyph, pen = master
+        snap_moved_points(pen.contours, master_contours, snap)
+        if not contours_differ(pen.contours, master_contours):
+            changed.append(False)
+            continue
+        if not dry_run:
+            write_glyph(glyph_set, glyph_name, glyph, pen, master_contours)
+        changed.append(True)
+    return changed
+
+
+# Each worker process keeps its own options and glyph sets, so a work unit is just a glyph.
+_worker_options = {}
+_worker_glyph_sets = {}
+
+def init_worker(options):
+    _worker_options.clear()
+    _worker_options.update(options)
+    _worker_glyph_sets.clear()
+
+def get_worker_glyph_set(layer):
+    layer_path, ufo_format_version = layer
+    glyph_set = _worker_glyph_sets.get(layer_path)
+    if glyph_set is None:
+        glyph_set = _worker_glyph_sets[layer_path] = GlyphSet(layer_path, ufoFormatVersion=ufo_format_version)
+    return glyph_set
+
+def overlap_work_unit(work_unit):
+    '''
+    Overlaps one glyph. `work_unit` is (layers, glyph name), see `get_layer()`:
+    one layer on its own, or all the masters with `--sync`. Returns [(layer, whether it changed)].
+    '''
+    layers, glyph_name = work_unit
+    if len(layers) == 1:
+        return [(layers[0], overlap_glyph(get_worker_glyph_set(layers[0]), glyph_name, **_worker_options))]
+    changed = overlap_glyph_masters([get_worker_glyph_set(layer) for layer in layers], glyph_name, **_worker_options)
+    return list(zip(layers, changed))
+
+def get_layer(ufo_path, layer_name):
+    '''Returns the layer as (glyphs folder path, UFO format version), and its glyph names.'''
+    reader = UFOReader(ufo_path)
+    try:
+        glyph_set = reader.getGlyphSet(layer_name)
+        layer = (os.path.join(ufo_path, glyph_set.dirName), reader.formatVersionTuple)
+        glyph_names = list(glyph_set.keys())
+    finally:
+        reader.close()
+    return layer, glyph_names
+
+def overlap_layers(sources, options, glyph_names=None, jobs=None, chunk_size=32, sync=False):
+    '''
+    Overlaps every (UFO path, layer name) in `sources`, spread over `jobs`
+    processes (1 keeps it all in this one). `options` are the keyword
+    arguments of `overlap_glyph()`. With `sync`, the sources are masters,
+    and the first one is the reference (see `overlap_glyph_masters()`).
+    Returns {source: [glyphs looked at, glyphs changed]}.
+    '''
+    counts = {}
+    source_layers = []
+    work_units = []
+    for source in sources:
+        layer, layer_glyph_names = get_layer(*source)
+        source_layers.append((source, layer))
+        if layer in counts:
+            continue
+        if glyph_names:
+            layer_glyph_names = [name for name in glyph_names if name in set(layer_glyph_names)]
+        counts[layer] = [len(layer_glyph_names), 0]
+        if not sync:
+            work_units += [((layer,), glyph_name) for glyph_name in layer_glyph_names]
+        elif not work_units:
+            # The reference’s glyphs, each one across every master
+            work_units = [(None, glyph_name) for glyph_name in layer_glyph_names]
+    if sync:
+        layers = tuple(counts)
+        work_units = [(layers, glyph_name) for _, glyph_name in work_units]
+
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(work_units) <= chunk_size:
+        init_worker(options)
+        results = map(overlap_work_unit, work_units)
+        for unit_results in results:
+            for layer, changed in unit_results:
+                counts[layer][1] += changed
+    else:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker, initargs=(options,)) as executor:
+            # Results stream back in chunks, as soon as each one is done.
+            for unit_results in executor.map(overlap_work_unit, work_units, chunksize=chunk_size):
+                for layer, changed in unit_results:
+                    counts[layer][1] += changed
+    return {source: counts[layer] for source, layer in source_layers}
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Add overlaps (+) or chamfers (-) to corners across UFOs and designspaces.")
+    parser.add_argument('paths', nargs='+', metavar='PATH',
+        help="UFOs and/or .designspace files. Changed glyphs are written back in place.")
+    parser.add_argument('-v', '--value', type=int, required=True,
+        help="How far to overlap each corner, in units. Negative values chamfer.")
+    parser.add_argument('--cross', action='store_true',
+        help="Pair up the matched corners of each glyph and cross-overlap them.")
+    parser.add_argument('--pairing', choices=('nearest', 'optimal'), default='nearest',
+        help="How --cross pairs corners: closest pair first, or shortest in total. Default: nearest.")
+    parser.add_argument('--sync', action='store_true',
+        help="Treat the sources of each designspace as masters: pick corners in the first one, and repeat them in the rest.")
+    parser.add_argument('-g', '--glyphs', nargs='+', metavar='NAME',
+        help="Only these glyphs. Default: all of them.")
+    parser.add_argument('--point-name', nargs='+', dest='point_names', metavar='NAME',
+        help="Only on-curves with one of these point names.")
+    parser.add_argument('--point-type', nargs='+', dest='point_types', choices=('line', 'curve'),
+        help="Only on-curves of these types. Corners next to quadratic curves are always skipped.")
+    parser.add_argument('--max-angle', type=float, metavar='DEGREES',
+        help="Only corners this sharp or sharper (180 is a straight line).")
+    parser.add_argument('--include-smooth', action='store_true',
+        help="Also overlap smooth on-curves. By default they’re skipped, since they aren’t corners.")
+    parser.add_argument('--snap', type=float, default=1, metavar='UNITS',
+        help="Round the results to this grid, like RoboFont’s snapping. 0 turns it off. Default: 1.")
+    parser.add_argument('-j', '--jobs', type=int, metavar='N',
+        help="How many processes to spread the glyphs over. Default: one per core.")
+    parser.add_argument('-n', '--dry-run', action='store_true',
+        help="Report what would change, without writing anything.")
+    args = parser.parse_args(args)
+
+    options = dict(
+        value=args.value,
+        rules=dict(point_names=args.point_names, point_types=args.point_types, max_angle=args.max_angle, include_smooth=args.include_smooth),
+        cross=args.cross,
+        pairing=args.pairing,
+        snap=args.snap,
+        dry_run=args.dry_run,
+        )
+    start = time.time()
+    if args.sync:
+        # Each designspace is its own family of masters.
+        counts = {}
+        for path in args.paths:
+            counts.update(overlap_layers(get_sources(path), options, glyph_names=args.glyphs, jobs=args.jobs, sync=True))
+    else:
+        sources = []
+        for path in args.paths:
+            sources += [source for source in get_sources(path) if source not in sources]
+        counts = overlap_layers(sources, options, glyph_names=args.glyphs, jobs=args.jobs)
+    for (ufo_path, layer_name), (checked, changed) in counts.items():
+        layer_text = f" ({layer_name})" if layer_name else ""
+        print(f"{ufo_path}{layer_text}: {changed} of {checked} glyphs overlapped")
+    total_checked = sum(checked for checked, changed in counts.values())
+    total_changed = sum(changed for checked, changed in counts.values())
+    print(f"Overlapper: {total_changed} of {total_checked} glyphs in {time.time() - start:.2f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,265 @@
+'''
+Checks that the masters of a family are still compatible, after overlapping.
+
+Overlaps add points, cross-overlaps join contours (see
+`engine.add_contour_to_end()`), and RoboFont’s Overlapper moves start points
+onto on-curves (`start_with_oncurve()`), so masters that were overlapped one
+at a time can drift apart. This compares a structure signature of every glyph
+(its contours’ point types, in order, where each contour starts, and its
+components) in each master to the default master, and lists the glyphs that
+don’t match. For example:
+
+    python overlapper_compat.py MyFamily.designspace
+    python overlapper_compat.py MyFont-Light.ufo MyFont-Bold.ufo --glyphs A V W
+    python overlapper_compat.py MyFamily.designspace --cache compat-cache.json
+
+With `--cache`, signatures are kept between runs, and only the .glif files
+that changed since (by modification time and size) are read again, so a
+check after overlapping a few glyphs only looks at those. The ones that
+need reading are spread over a pool of processes, like overlapper_cli.py.
+'''
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from xml.etree import ElementTree
+from fontTools.ufoLib.glifLib import GlyphSet
+from fontTools.designspaceLib import DesignSpaceDocument
+import overlapper_engine as engine
+from overlapper_cli import get_layer
+
+
+# One letter per point, so a contour’s signature is a short string that compares (and caches) quickly.
+TYPE_LETTERS = {'line': 'l', 'curve': 'c', 'qcurve': 'q', 'offcurve': 'o', 'move': 'm'}
+TYPE_NAMES = {letter: point_type for point_type, letter in TYPE_LETTERS.items()}
+# Bump this when the signatures change, so old caches get thrown out.
+CACHE_VERSION = 3
+
+
+def get_masters(path):
+    '''Returns the (UFO path, layer name) of each master of a designspace, the default one first. A UFO is one master.'''
+    if not path.endswith('.designspace'):
+        return [(path, None)]
+    doc = DesignSpaceDocument.fromfile(path)
+    default = doc.findDefault()
+    masters = []
+    for source in ([default] if default is not None else []) + doc.sources:
+        if (source.path, source.layerName) not in masters:
+            masters.append((source.path, source.layerName))
+    return masters
+
+def get_start_offset(points):
+    '''
+    Where a contour starts, from its points as (x, y, type): the index of
+    the on-curve nearest the lower left corner of its bounds. Moving the start
+    point changes it, even where point types alone can’t tell (an all-line
+    contour). Returns -1 for a contour without on-curves.
+    '''
+    if not points:
+        return -1
+    left = min(x for x, y, point_type in points)
+    bottom = min(y for x, y, point_type in points)
+    nearest = -1
+    nearest_distance = None
+    for pt_index, (x, y, point_type) in enumerate(points):
+        if point_type == 'offcurve':
+            continue
+        distance = (x - left) ** 2 + (y - bottom) ** 2
+        if nearest_distance is None or distance < nearest_distance:
+            nearest, nearest_distance = pt_index, distance
+    return nearest
+
+def get_glyph_signature(contours, components=()):
+    '''
+    A glyph’s structure, as (contour signatures, component base glyphs,
+    contour start offsets). Masters interpolate when these are equal.
+    '''
+    contour_signatures = tuple(''.join(TYPE_LETTERS.get(point_type, '?') for point_type in contour_types) for contour_types in engine.get_contour_signature(contours))
+    starts = tuple(get_start_offset([(pt.x, pt.y, pt.type) for pt in c.points]) for c in contours)
+    return contour_signatures, tuple(base_glyph for base_glyph, transformation, identifier in components), starts
+
+def read_glif_signature(glif_path):
+    '''
+    The same as `get_glyph_signature()`, straight from a .glif. Only the
+    outline’s point types are looked at, which is a few times quicker than
+    reading the whole glyph with glifLib.
+    '''
+    outline = ElementTree.parse(glif_path).getroot().find('outline')
+    contour_signatures, components, starts = [], [], []
+    if outline is not None:
+        for element in outline:
+            if element.tag == 'component':
+                components.append(element.get('base'))
+            elif element.tag == 'contour':
+                points = element.findall('point')
+                # In format 1, anchors are contours of a single named move.
+                if len(points) == 1 and points[0].get('type') == 'move' and points[0].get('name') is not None:
+                    continue
+                contour_signatures.append(''.join(TYPE_LETTERS.get(pt.get('type', 'offcurve'), '?') for pt in points))
+                starts.append(get_start_offset([(float(pt.get('x')), float(pt.get('y')), pt.get('type', 'offcurve')) for pt in points]))
+    return tuple(contour_signatures), tuple(components), tuple(starts)
+
+def read_signatures(work_unit):
+    '''Reads the signatures of some .glif files of one layer. `work_unit` is (layer path, [(glyph name, file name)]). Returns [(glyph name, signature)].'''
+    layer_path, glyph_files = work_unit
+    return [(glyph_name, read_glif_signature(os.path.join(layer_path, file_name))) for glyph_name, file_name in glyph_files]
+
+def describe_difference(reference, signature):
+    '''Says how `signature` differs from `reference`, in a few words.'''
+    ref_contours, ref_components, ref_starts = reference
+    contours, components, starts = signature
+    if len(contours) != len(ref_contours):
+        return f"{len(contours)} contours instead of {len(ref_contours)}"
+    for c_index, (ref_c, c) in enumerate(zip(ref_contours, contours)):
+        if ref_c == c:
+            continue
+        if ref_c.startswith('m') != c.startswith('m'):
+            return f"contour {c_index} is {'open' if c.startswith('m') else 'closed'}"
+        if len(c) != len(ref_c):
+            return f"contour {c_index} has {len(c)} points instead of {len(ref_c)}"
+        # Same points, in another order: most likely a different start point.
+        for shift in range(1, len(c)):
+            if c[shift:] + c[:shift] == ref_c:
+                return f"contour {c_index} starts at a different point"
+        pt_index = next(i for i, (a, b) in enumerate(zip(ref_c, c)) if a != b)
+        return f"contour {c_index}, point {pt_index}: {TYPE_NAMES.get(c[pt_index], c[pt_index])} instead of {TYPE_NAMES.get(ref_c[pt_index], ref_c[pt_index])}"
+    if components != ref_components:
+        return f"components {', '.join(components) or 'none'} instead of {', '.join(ref_components) or 'none'}"
+    for c_index, (ref_start, start) in enumerate(zip(ref_starts, starts)):
+        if start != ref_start:
+            return f"contour {c_index} starts at a different point (its lower left point is point {start} instead of {ref_start})"
+    return "no difference"
+
+
+class SignatureCache:
+    '''
+    Glyph signatures by layer and glyph name, with the modification time and
+    size of the .glif they were read from, so only changed glyphs get read again.
+    '''
+
+    def __init__(self, path=None):
+        self.path = path
+        # {layer path: {glyph name: [mtime_ns, size, signature]}}
+        self.layers = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            if data.get('version') == CACHE_VERSION:
+                for layer_path, glyphs in data['layers'].items():
+                    self.layers[layer_path] = {
+                        glyph_name: [mtime_ns, size, (tuple(contours), tuple(components), tuple(starts))]
+                        for glyph_name, (mtime_ns, size, (contours, components, starts)) in glyphs.items()
+                        }
+
+    def save(self):
+        if not self.path:
+            return
+        with open(self.path, 'w') as f:
+            json.dump({'version': CACHE_VERSION, 'layers': self.layers}, f, separators=(',', ':'))
+
+    def get_stale(self, layer_path, glyph_stats):
+        '''The glyphs of `glyph_stats` ({name: (mtime_ns, size)}) whose .glif changed since they were cached.'''
+        cached = self.layers.get(layer_path, {})
+        stale = []
+        for glyph_name, stat in glyph_stats.items():
+            entry = cached.get(glyph_name)
+            if entry is None or (entry[0], entry[1]) != stat:
+                stale.append(glyph_name)
+        return stale
+
+    def update(self, layer_path, glyph_stats, signatures):
+        cached = self.layers.setdefault(layer_path, {})
+        for glyph_name, signature in signatures:
+            cached[glyph_name] = [*glyph_stats[glyph_name], signature]
+
+    def get(self, layer_path, glyph_name):
+        entry = self.layers.get(layer_path, {}).get(glyph_name)
+        return entry[2] if entry is not None else None
+
+
+def get_glyph_stats(layer_path, glyph_names=None):
+    '''Returns {glyph name: (mtime_ns, size)} of the .glif files of a layer, and {glyph name: file name}.'''
+    contents = GlyphSet(layer_path).contents
+    if glyph_names:
+        contents = {glyph_name: file_name for glyph_name, file_name in contents.items() if glyph_name in glyph_names}
+    stats = {}
+    for glyph_name, file_name in contents.items():
+        stat = os.stat(os.path.join(layer_path, file_name))
+        stats[glyph_name] = (stat.st_mtime_ns, stat.st_size)
+    return stats, contents
+
+def check_masters(masters, glyph_names=None, cache=None, jobs=None, chunk_size=256):
+    '''
+    Compares every glyph in each of `masters` ((UFO path, layer name), the
+    reference first) to the reference. Only glyphs that changed since `cache`
+    (a `SignatureCache`) last saw them are read, over `jobs` processes.
+    Returns (mismatches as [(glyph name, master, difference)], glyphs read).
+    '''
+    cache = cache or SignatureCache()
+    layers = [get_layer(*master)[0] for master in masters]
+    glyph_names = set(glyph_names) if glyph_names else None
+    layer_stats = {}
+    work_units = []
+    for layer_path, ufo_format_version in layers:
+        if layer_path in layer_stats:
+            continue
+        stats, contents = get_glyph_stats(layer_path, glyph_names)
+        layer_stats[layer_path] = stats
+        stale = [(glyph_name, contents[glyph_name]) for glyph_name in cache.get_stale(layer_path, stats)]
+        work_units += [(layer_path, stale[i:i + chunk_size]) for i in range(0, len(stale), chunk_size)]
+
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(work_units) <= 1:
+        for (layer_path, glyph_files), signatures in zip(work_units, map(read_signatures, work_units)):
+            cache.update(layer_path, layer_stats[layer_path], signatures)
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            for (layer_path, glyph_files), signatures in zip(work_units, executor.map(read_signatures, work_units)):
+                cache.update(layer_path, layer_stats[layer_path], signatures)
+
+    mismatches = []
+    reference_path = layers[0][0]
+    for glyph_name in sorted(layer_stats[reference_path]):
+        reference = cache.get(reference_path, glyph_name)
+        for master, (layer_path, ufo_format_version) in zip(masters[1:], layers[1:]):
+            if glyph_name not in layer_stats[layer_path]:
+                # Sparse masters don’t need every glyph.
+                continue
+            signature = cache.get(layer_path, glyph_name)
+            if signature != reference:
+                mismatches.append((glyph_name, master, describe_difference(reference, signature)))
+    return mismatches, sum(len(glyph_files) for layer_path, glyph_files in work_units)
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Check that the masters of a family still interpolate, after overlapping.")
+    parser.add_argument('paths', nargs='+', metavar='PATH',
+        help="A designspace (its default source is the reference), or UFOs (the first one is the reference).")
+    parser.add_argument('-g', '--glyphs', nargs='+', metavar='NAME',
+        help="Only these glyphs. Default: all of them.")
+    parser.add_argument('--cache', metavar='PATH',
+        help="Keep signatures in this file between runs, and only read the glyphs that changed.")
+    parser.add_argument('-j', '--jobs', type=int, metavar='N',
+        help="How many processes to read glyphs with. Default: one per core.")
+    args = parser.parse_args(args)
+
+    masters = []
+    for path in args.paths:
+        masters += [master for master in get_masters(path) if master not in masters]
+    start = time.time()
+    cache = SignatureCache(args.cache)
+    mismatches, read_count = check_masters(masters, glyph_names=args.glyphs, cache=cache, jobs=args.jobs)
+    cache.save()
+    for glyph_name, (ufo_path, layer_name), difference in mismatches:
+        layer_text = f" ({layer_name})" if layer_name else ""
+        print(f"{glyph_name}: {ufo_path}{layer_text}: {difference}")
+    print(f"Overlapper: {len({glyph_name for glyph_name, master, difference in mismatches})} incompatible glyphs in {len(masters)} masters ({read_count} glyphs read) in {time.time() - start:.2f} s")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
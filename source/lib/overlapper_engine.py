@@ -0,0 +1,1433 @@
+'''
+Overlapper’s geometry, without RoboFont.
+
+Everything in here works on plain contour data (`OverlapContour`s made of
+`OverlapPoint`s), so it can run headless: on a build server, in a profiler,
+or over a whole font at once. Anything that can draw itself into a point pen
+(a glyph, a contour, a .glif) can be read in with `read_contours()`, and the
+results can be drawn back out into any point pen with `draw_contours()`.
+'''
+
+from math import sqrt, atan2, degrees, floor
+from fontTools.misc.bezierTools import splitCubicAtT, approximateCubicArcLength
+from fontTools.pens.pointPen import AbstractPointPen
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# Below this many corners, NumPy's overhead costs more than it saves.
+NUMPY_MIN_CORNERS = 64
+NUMPY_MIN_RUNS = 64
+NUMPY_MIN_POINTS = 64
+
+# How far (in units) a point can stray from the line and still count as on it, when cleaning up after a cross-overlap.
+COLLINEAR_TOLERANCE = 0.5
+
+
+# ======================================================================================
+# Contour data
+
+
+class OverlapPoint:
+    '''A point. Attribute names follow fontParts, so helpers work on either.'''
+
+    # There can be a lot of these, and they get copied every cross-overlap frame.
+    __slots__ = ('x', 'y', 'type', 'smooth', 'name', 'identifier')
+
+    def __init__(self, x, y, type='line', smooth=False, name=None, identifier=None):
+        self.x = x
+        self.y = y
+        self.type = type
+        self.smooth = smooth
+        self.name = name
+        self.identifier = identifier
+
+    def __repr__(self):
+        return f"<OverlapPoint {self.type} ({self.x}, {self.y})>"
+
+    @property
+    def coords(self):
+        return (self.x, self.y)
+
+    def copy(self):
+        return OverlapPoint(self.x, self.y, self.type, self.smooth, self.name, self.identifier)
+
+
+class SegmentView:
+    '''
+    One segment of a contour, looked at in place rather than copied out: the
+    `length` points from `start`, wrapping around the end of the contour.
+    Indexes and iterates like the list of points fontParts would give.
+    '''
+
+    __slots__ = ('points', 'start', 'length')
+
+    def __init__(self, points, start, length):
+        self.points = points
+        self.start = start
+        self.length = length
+
+    def __repr__(self):
+        return f"<SegmentView {list(self)}>"
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.length))]
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("segment index out of range")
+        return self.points[(self.start + index) % len(self.points)]
+
+    def __iter__(self):
+        points, point_count = self.points, len(self.points)
+        for i in range(self.start, self.start + self.length):
+            yield points[i % point_count]
+
+
+class OverlapContour:
+    '''A list of `OverlapPoint`s. Open contours start with a `move` point.'''
+
+    __slots__ = ('points', 'identifier')
+
+    def __init__(self, points=None, identifier=None):
+        self.points = points if points is not None else []
+        self.identifier = identifier
+
+    def __repr__(self):
+        return f"<OverlapContour {len(self.points)} points>"
+
+    @property
+    def open(self):
+        return bool(self.points) and self.points[0].type == 'move'
+
+    @property
+    def segments(self):
+        '''`SegmentView`s, each ending with an on-curve. Same order as fontParts’ `contour.segments`.'''
+        # (start, length) of each run of points that ends with an on-curve, and any trailing off-curves
+        bounds = []
+        start = 0
+        for i, pt in enumerate(self.points):
+            if pt.type != 'offcurve':
+                bounds.append((start, i + 1 - start))
+                start = i + 1
+        last_was_offcurve = start < len(self.points)
+        if last_was_offcurve:
+            bounds.append((start, len(self.points) - start))
+        if not bounds:
+            return []
+        if last_was_offcurve and self.open:
+            # Ignore trailing off-curves
+            del bounds[-1]
+        elif last_was_offcurve and len(bounds) > 1:
+            # Trailing off-curves lead into the first on-curve.
+            start, length = bounds.pop(-1)
+            bounds.append((start, length + bounds.pop(0)[1]))
+        elif not last_was_offcurve and not self.open:
+            bounds.append(bounds.pop(0))
+        return [SegmentView(self.points, start, length) for start, length in bounds]
+
+    def copy(self):
+        return OverlapContour([pt.copy() for pt in self.points], self.identifier)
+
+    def drawPoints(self, pen):
+        pen.beginPath(identifier=self.identifier)
+        for pt in self.points:
+            segment_type = None if pt.type == 'offcurve' else pt.type
+            pen.addPoint((pt.x, pt.y), segmentType=segment_type, smooth=pt.smooth, name=pt.name, identifier=pt.identifier)
+        pen.endPath()
+
+
+class ContourPointPen(AbstractPointPen):
+    '''Collects whatever is drawn into it as `OverlapContour`s. Components are kept to the side.'''
+
+    def __init__(self):
+        self.contours = []
+        self.components = []
+
+    def beginPath(self, identifier=None, **kwargs):
+        self.contours.append(OverlapContour(identifier=identifier))
+
+    def endPath(self):
+        pass
+
+    def addPoint(self, pt, segmentType=None, smooth=False, name=None, identifier=None, **kwargs):
+        self.contours[-1].points.append(
+            OverlapPoint(pt[0], pt[1], segmentType or 'offcurve', smooth, name, identifier))
+
+    def addComponent(self, baseGlyph, transformation, identifier=None, **kwargs):
+        self.components.append((baseGlyph, transformation, identifier))
+
+
+def read_contours(drawables):
+    '''Reads a glyph (or a list of contours), or anything else with `drawPoints`, into `OverlapContour`s.'''
+    pen = ContourPointPen()
+    if hasattr(drawables, 'drawPoints'):
+        drawables.drawPoints(pen)
+    else:
+        for drawable in drawables:
+            drawable.drawPoints(pen)
+    return pen.contours
+
+def draw_contours(contours, pen):
+    for c in contours:
+        c.drawPoints(pen)
+
+
+# ======================================================================================
+# Helpers
+
+
+def lengthen_line(pt1, pt2, factor, direction="out"):
+    x1, y1, x2, y2           = pt1[0], pt1[1], pt2[0], pt2[1]
+    delta_x, delta_y         = x2 - x1, y2 - y1
+    new_delta_x, new_delta_y = delta_x * factor, delta_y * factor
+    new_x, new_y             = new_delta_x + x1, new_delta_y + y1
+
+    if direction == "in":
+        return ((x2, y2), (new_x, new_y))
+    else:
+        return ((new_x, new_y), (x2, y2))
+
+def get_vector_distance(pt1, pt2):
+    try:
+        x1, y1, x2, y2 = pt1.x, pt1.y, pt2.x, pt2.y
+    except:
+        x1, y1, x2, y2 = pt1[0], pt1[1], pt2[0], pt2[1]
+    dist = sqrt((x2-x1)**2 + (y2-y1)**2)
+    return abs(dist)
+
+def my_round(x, base=1):
+    if base == 0:
+        return x
+    return base * round(x/base)
+
+def snap_coordinates(coords, base=1):
+    '''`my_round()` for a whole list of (x, y), in one go. Returns a new list.'''
+    if base == 0:
+        return list(coords)
+    if numpy is None or len(coords) < NUMPY_MIN_POINTS:
+        return [(my_round(x, base), my_round(y, base)) for x, y in coords]
+    # NumPy rounds halves to even, same as `round()`.
+    snapped = numpy.round(numpy.asarray(coords, dtype=float) / base) * base
+    if isinstance(base, int):
+        snapped = snapped.astype(int)
+    return [tuple(coord) for coord in snapped.tolist()]
+
+def get_corner_angle(contour, index):
+    '''The angle, in degrees, between the segments that meet at an on-curve. 180 means there’s no corner.'''
+    points = contour.points
+    here = points[index].coords
+    neighbours = []
+    for step in (-1, 1):
+        for n in range(1, len(points)):
+            coords = points[(index + step * n) % len(points)].coords
+            if coords != here:
+                neighbours.append(coords)
+                break
+    if len(neighbours) < 2:
+        return 180.0
+    (before_x, before_y), (after_x, after_y) = neighbours
+    angle = abs(degrees(atan2(before_y - here[1], before_x - here[0]) - atan2(after_y - here[1], after_x - here[0])))
+    return min(angle, 360 - angle)
+
+def average_coordinates(list_of_coords):
+    av_x = sum([x for (x, y) in list_of_coords]) / len(list_of_coords)
+    av_y = sum([y for (x, y) in list_of_coords]) / len(list_of_coords)
+    return(av_x, av_y)
+
+class SpatialHash:
+    '''
+    Buckets coordinates into a grid of square cells, so the coordinates near
+    a spot can be found without measuring the distance to every one of them.
+    '''
+
+    def __init__(self, coords, cell_size=None):
+        coords = list(coords)
+        if cell_size is None and coords:
+            # Roughly one coordinate per cell
+            xs, ys = [x for x, y in coords], [y for x, y in coords]
+            cell_size = max(max(xs) - min(xs), max(ys) - min(ys)) / sqrt(len(coords))
+        self.cell_size = cell_size or 1
+        self.cells = {}
+        self.bounds = None
+        for coord in coords:
+            self.add(coord)
+
+    def get_cell(self, coord):
+        return (floor(coord[0] / self.cell_size), floor(coord[1] / self.cell_size))
+
+    def add(self, coord):
+        cell = self.get_cell(coord)
+        self.cells.setdefault(cell, []).append(coord)
+        if self.bounds is None:
+            self.bounds = cell + cell
+        else:
+            x_min, y_min, x_max, y_max = self.bounds
+            self.bounds = (min(x_min, cell[0]), min(y_min, cell[1]), max(x_max, cell[0]), max(y_max, cell[1]))
+
+    def remove(self, coord):
+        self.cells[self.get_cell(coord)].remove(coord)
+
+    def get_ring(self, cell, ring):
+        '''The cells `ring` steps away from `cell`.'''
+        cell_x, cell_y = cell
+        if ring == 0:
+            return [cell]
+        cells = []
+        for i in range(-ring, ring + 1):
+            cells += [(cell_x + i, cell_y - ring), (cell_x + i, cell_y + ring)]
+        for i in range(-ring + 1, ring):
+            cells += [(cell_x - ring, cell_y + i), (cell_x + ring, cell_y + i)]
+        return cells
+
+    def nearest(self, coord, order=None):
+        '''
+        The closest coordinate to `coord`, ignoring any at the very same spot,
+        as (distance, coordinate), or None. If there’s a tie, the one that comes
+        first in the `order` dict ({coordinate: position}) wins.
+        '''
+        if self.bounds is None:
+            return None
+        cell = self.get_cell(coord)
+        x_min, y_min, x_max, y_max = self.bounds
+        last_ring = max(cell[0] - x_min, x_max - cell[0], cell[1] - y_min, y_max - cell[1])
+        best = None
+        for ring in range(last_ring + 1):
+            for ring_cell in self.get_ring(cell, ring):
+                for other in self.cells.get(ring_cell, ()):
+                    dist = get_vector_distance(coord, other)
+                    if dist == 0:
+                        continue
+                    candidate = (dist, order[other] if order else 0, other)
+                    if best is None or candidate[:2] < best[:2]:
+                        best = candidate
+            # Anything further out is at least this far away.
+            if best is not None and best[0] < ring * self.cell_size:
+                break
+        if best is None:
+            return None
+        return best[0], best[2]
+
+
+class CoordIndex:
+    '''
+    Where every point of a list of contours is: {coordinates: [(contour, point)]}.
+    The cross-overlap surgery keeps it up to date as it breaks, joins and
+    removes contours, so finding the handful of points it’s after never means
+    going through the whole glyph. A contour has to be removed from the index
+    before it’s changed, and added back after.
+    '''
+
+    def __init__(self, contours):
+        self.entries = {}
+        for c in contours:
+            self.add_contour(c)
+
+    def add_contour(self, contour):
+        for pt in contour.points:
+            self.entries.setdefault(pt.coords, []).append((contour, pt))
+
+    def remove_contour(self, contour):
+        for coords in {pt.coords for pt in contour.points}:
+            entries = [entry for entry in self.entries.get(coords, ()) if entry[0] is not contour]
+            if entries:
+                self.entries[coords] = entries
+            else:
+                self.entries.pop(coords, None)
+
+    def find(self, point_coordinates, contours=None):
+        '''
+        (contour, point index, point) for every point at one of `point_coordinates`.
+        With `contours`, they come in the order that going through `contours` point by point would find them.
+        '''
+        found = []
+        seen = set()
+        point_indexes = {}
+        for coords in point_coordinates:
+            # Results that didn’t move are left empty.
+            if len(coords) != 2:
+                continue
+            coords = tuple(coords)
+            if coords in seen:
+                continue
+            seen.add(coords)
+            for contour, pt in self.entries.get(coords, ()):
+                if id(contour) not in point_indexes:
+                    point_indexes[id(contour)] = {id(c_pt): i for i, c_pt in enumerate(contour.points)}
+                found.append((contour, point_indexes[id(contour)][id(pt)], pt))
+        if contours is not None:
+            contour_indexes = {id(c): i for i, c in enumerate(contours)}
+            found.sort(key=lambda item: (contour_indexes[id(item[0])], item[1]))
+        return found
+
+    def group(self, point_coordinates, contours):
+        '''The same as `find()`, grouped as [(contour, [(point index, point)])], in contour order.'''
+        groups = []
+        for contour, pt_index, pt in self.find(point_coordinates, contours):
+            if not groups or groups[-1][0] is not contour:
+                groups.append((contour, []))
+            groups[-1][1].append((pt_index, pt))
+        return groups
+
+
+def get_closest_two_coords(list_of_coordinates):
+    # Ties go to whichever comes first in the list, so the pairing is stable.
+    order = {}
+    for i, coord in enumerate(list_of_coordinates):
+        order.setdefault(coord, i)
+    spatial_hash = SpatialHash(order)
+    closest = None
+    for coord, i in order.items():
+        nearest = spatial_hash.nearest(coord, order)
+        if nearest is None:
+            continue
+        dist, other = nearest
+        if closest is None or (dist, i) < closest[:2]:
+            closest = (dist, i, [coord, other])
+    if closest is None:
+        return []
+    return closest[2]
+
+def get_coord_occurrences(contours, coords):
+    '''(coordinates, contour index, point index) of every point at one of `coords`, in contour order.'''
+    coords = set(coords)
+    occurrences = []
+    for c_index, c in enumerate(contours):
+        for pt_index, pt in enumerate(c.points):
+            if (pt.x, pt.y) in coords:
+                occurrences.append(((pt.x, pt.y), c_index, pt_index))
+    return occurrences
+
+def get_noncontiguous_near_coords(occurrences, list_of_coordinates):
+    # Based on indexes. `occurrences` come from `get_coord_occurrences()`.
+    if len(list_of_coordinates) <= 2:
+        return tuple(list_of_coordinates)
+    remaining = set(list_of_coordinates)
+    coord_pair = []
+    coord_candidates = []
+    base = None
+    for coord, c_index, pt_index in occurrences:
+        if coord not in remaining:
+            continue
+        if base == None:
+            coord_pair.append(coord)
+            base = (c_index, pt_index)
+        else:
+            if c_index != base[0]:
+                coord_candidates.append(coord)
+            if abs(pt_index - base[1]) > 1:
+                coord_candidates.append(coord)
+    coord_pair = tuple(get_closest_two_coords(coord_pair + coord_candidates))
+    return coord_pair
+
+def max_weight_matching(edges, max_cardinality=False):
+    '''
+    Edmonds’ blossom algorithm, after Joris van Rantwijk’s public domain
+    implementation. `edges` are (i, j, weight), with vertices numbered from 0
+    and integer weights. Returns a list where item i is the vertex that i is
+    matched with, or -1. With `max_cardinality`, the heaviest of the matchings
+    with the most pairs is returned.
+    '''
+    if not edges:
+        return []
+    edge_count = len(edges)
+    vertex_count = 1 + max(max(i, j) for i, j, weight in edges)
+    max_weight = max(0, max(weight for i, j, weight in edges))
+    # Edge k has endpoints 2k and 2k + 1.
+    endpoint = [edges[p // 2][p % 2] for p in range(2 * edge_count)]
+    neighbend = [[] for i in range(vertex_count)]
+    for k, (i, j, weight) in enumerate(edges):
+        neighbend[i].append(2 * k + 1)
+        neighbend[j].append(2 * k)
+    mate = vertex_count * [-1]
+    # Top-level blossoms are labelled 1 (S), 2 (T), or 0 (free).
+    label = (2 * vertex_count) * [0]
+    labelend = (2 * vertex_count) * [-1]
+    inblossom = list(range(vertex_count))
+    blossomparent = (2 * vertex_count) * [-1]
+    blossomchilds = (2 * vertex_count) * [None]
+    blossombase = list(range(vertex_count)) + vertex_count * [-1]
+    blossomendps = (2 * vertex_count) * [None]
+    bestedge = (2 * vertex_count) * [-1]
+    blossombestedges = (2 * vertex_count) * [None]
+    unusedblossoms = list(range(vertex_count, 2 * vertex_count))
+    dualvar = vertex_count * [max_weight] + vertex_count * [0]
+    allowedge = edge_count * [False]
+    queue = []
+
+    def slack(k):
+        i, j, weight = edges[k]
+        return dualvar[i] + dualvar[j] - 2 * weight
+
+    def blossom_leaves(b):
+        if b < vertex_count:
+            yield b
+        else:
+            for t in blossomchilds[b]:
+                if t < vertex_count:
+                    yield t
+                else:
+                    yield from blossom_leaves(t)
+
+    def assign_label(w, t, p):
+        b = inblossom[w]
+        label[w] = label[b] = t
+        labelend[w] = labelend[b] = p
+        bestedge[w] = bestedge[b] = -1
+        if t == 1:
+            queue.extend(blossom_leaves(b))
+        elif t == 2:
+            base = blossombase[b]
+            assign_label(endpoint[mate[base]], 1, mate[base] ^ 1)
+
+    def scan_blossom(v, w):
+        # Trace back from v and w to find a new blossom’s base, or -1 for an augmenting path.
+        path = []
+        base = -1
+        while v != -1 or w != -1:
+            b = inblossom[v]
+            if label[b] & 4:
+                base = blossombase[b]
+                break
+            path.append(b)
+            label[b] = 5
+            if labelend[b] == -1:
+                v = -1
+            else:
+                v = endpoint[labelend[b]]
+                b = inblossom[v]
+                v = endpoint[labelend[b]]
+            if w != -1:
+                v, w = w, v
+        for b in path:
+            label[b] = 1
+        return base
+
+    def add_blossom(base, k):
+        v, w, weight = edges[k]
+        bb, bv, bw = inblossom[base], inblossom[v], inblossom[w]
+        b = unusedblossoms.pop()
+        blossombase[b] = base
+        blossomparent[b] = -1
+        blossomparent[bb] = b
+        blossomchilds[b] = path = []
+        blossomendps[b] = endps = []
+        while bv != bb:
+            blossomparent[bv] = b
+            path.append(bv)
+            endps.append(labelend[bv])
+            v = endpoint[labelend[bv]]
+            bv = inblossom[v]
+        path.append(bb)
+        path.reverse()
+        endps.reverse()
+        endps.append(2 * k)
+        while bw != bb:
+            blossomparent[bw] = b
+            path.append(bw)
+            endps.append(labelend[bw] ^ 1)
+            w = endpoint[labelend[bw]]
+            bw = inblossom[w]
+        label[b] = 1
+        labelend[b] = labelend[bb]
+        dualvar[b] = 0
+        for v in blossom_leaves(b):
+            if label[inblossom[v]] == 2:
+                queue.append(v)
+            inblossom[v] = b
+        best_edge_to = (2 * vertex_count) * [-1]
+        for bv in path:
+            if blossombestedges[bv] is None:
+                neighbour_lists = [[p // 2 for p in neighbend[v]] for v in blossom_leaves(bv)]
+            else:
+                neighbour_lists = [blossombestedges[bv]]
+            for neighbour_list in neighbour_lists:
+                for k in neighbour_list:
+                    i, j, weight = edges[k]
+                    if inblossom[j] == b:
+                        i, j = j, i
+                    bj = inblossom[j]
+                    if bj != b and label[bj] == 1 and (best_edge_to[bj] == -1 or slack(k) < slack(best_edge_to[bj])):
+                        best_edge_to[bj] = k
+            blossombestedges[bv] = None
+            bestedge[bv] = -1
+        blossombestedges[b] = [k for k in best_edge_to if k != -1]
+        bestedge[b] = -1
+        for k in blossombestedges[b]:
+            if bestedge[b] == -1 or slack(k) < slack(bestedge[b]):
+                bestedge[b] = k
+
+    def expand_blossom(b, endstage):
+        for s in blossomchilds[b]:
+            blossomparent[s] = -1
+            if s < vertex_count:
+                inblossom[s] = s
+            elif endstage and dualvar[s] == 0:
+                expand_blossom(s, endstage)
+            else:
+                for v in blossom_leaves(s):
+                    inblossom[v] = s
+        if not endstage and label[b] == 2:
+            # Relabel the sub-blossoms on the path through this T-blossom.
+            entrychild = inblossom[endpoint[labelend[b] ^ 1]]
+            j = blossomchilds[b].index(entrychild)
+            if j & 1:
+                j -= len(blossomchilds[b])
+                jstep = 1
+                endptrick = 0
+            else:
+                jstep = -1
+                endptrick = 1
+            p = labelend[b]
+            while j != 0:
+                label[endpoint[p ^ 1]] = 0
+                label[endpoint[blossomendps[b][j - endptrick] ^ endptrick ^ 1]] = 0
+                assign_label(endpoint[p ^ 1], 2, p)
+                allowedge[blossomendps[b][j - endptrick] // 2] = True
+                j += jstep
+                p = blossomendps[b][j - endptrick] ^ endptrick
+                allowedge[p // 2] = True
+                j += jstep
+            bv = blossomchilds[b][j]
+            label[endpoint[p ^ 1]] = label[bv] = 2
+            labelend[endpoint[p ^ 1]] = labelend[bv] = p
+            bestedge[bv] = -1
+            j += jstep
+            while blossomchilds[b][j] != entrychild:
+                bv = blossomchilds[b][j]
+                if label[bv] == 1:
+                    j += jstep
+                    continue
+                for v in blossom_leaves(bv):
+                    if label[v] != 0:
+                        break
+                if label[v] != 0:
+                    label[v] = 0
+                    label[endpoint[mate[blossombase[bv]]]] = 0
+                    assign_label(v, 2, labelend[v])
+                j += jstep
+        label[b] = labelend[b] = -1
+        blossomchilds[b] = blossomendps[b] = None
+        blossombase[b] = -1
+        blossombestedges[b] = None
+        bestedge[b] = -1
+        unusedblossoms.append(b)
+
+    def augment_blossom(b, v):
+        t = v
+        while blossomparent[t] != b:
+            t = blossomparent[t]
+        if t >= vertex_count:
+            augment_blossom(t, v)
+        i = j = blossomchilds[b].index(t)
+        if i & 1:
+            j -= len(blossomchilds[b])
+            jstep = 1
+            endptrick = 0
+        else:
+            jstep = -1
+            endptrick = 1
+        while j != 0:
+            j += jstep
+            t = blossomchilds[b][j]
+            p = blossomendps[b][j - endptrick] ^ endptrick
+            if t >= vertex_count:
+                augment_blossom(t, endpoint[p])
+            j += jstep
+            t = blossomchilds[b][j]
+            if t >= vertex_count:
+                augment_blossom(t, endpoint[p ^ 1])
+            mate[endpoint[p]] = p ^ 1
+            mate[endpoint[p ^ 1]] = p
+        blossomchilds[b] = blossomchilds[b][i:] + blossomchilds[b][:i]
+        blossomendps[b] = blossomendps[b][i:] + blossomendps[b][:i]
+        blossombase[b] = blossombase[blossomchilds[b][0]]
+
+    def augment_matching(k):
+        v, w, weight = edges[k]
+        for s, p in ((v, 2 * k + 1), (w, 2 * k)):
+            while True:
+                bs = inblossom[s]
+                if bs >= vertex_count:
+                    augment_blossom(bs, s)
+                mate[s] = p
+                if labelend[bs] == -1:
+                    break
+                t = endpoint[labelend[bs]]
+                bt = inblossom[t]
+                s = endpoint[labelend[bt]]
+                j = endpoint[labelend[bt] ^ 1]
+                if bt >= vertex_count:
+                    augment_blossom(bt, j)
+                mate[j] = labelend[bt]
+                p = labelend[bt] ^ 1
+
+    for stage in range(vertex_count):
+        label[:] = (2 * vertex_count) * [0]
+        bestedge[:] = (2 * vertex_count) * [-1]
+        blossombestedges[vertex_count:] = vertex_count * [None]
+        allowedge[:] = edge_count * [False]
+        queue[:] = []
+        for v in range(vertex_count):
+            if mate[v] == -1 and label[inblossom[v]] == 0:
+                assign_label(v, 1, -1)
+        augmented = False
+        while True:
+            while queue and not augmented:
+                v = queue.pop()
+                for p in neighbend[v]:
+                    k = p // 2
+                    w = endpoint[p]
+                    if inblossom[v] == inblossom[w]:
+                        continue
+                    if not allowedge[k]:
+                        kslack = slack(k)
+                        if kslack <= 0:
+                            allowedge[k] = True
+                    if allowedge[k]:
+                        if label[inblossom[w]] == 0:
+                            assign_label(w, 2, p ^ 1)
+                        elif label[inblossom[w]] == 1:
+                            base = scan_blossom(v, w)
+                            if base >= 0:
+                                add_blossom(base, k)
+                            else:
+                                augment_matching(k)
+                                augmented = True
+                                break
+                        elif label[w] == 0:
+                            label[w] = 2
+                            labelend[w] = p ^ 1
+                    elif label[inblossom[w]] == 1:
+                        b = inblossom[v]
+                        if bestedge[b] == -1 or kslack < slack(bestedge[b]):
+                            bestedge[b] = k
+                    elif label[w] == 0:
+                        if bestedge[w] == -1 or kslack < slack(bestedge[w]):
+                            bestedge[w] = k
+            if augmented:
+                break
+
+            # No augmenting path yet: adjust the dual variables by the smallest allowed delta.
+            delta_type = -1
+            delta = delta_edge = delta_blossom = None
+            if not max_cardinality:
+                delta_type = 1
+                delta = min(dualvar[:vertex_count])
+            for v in range(vertex_count):
+                if label[inblossom[v]] == 0 and bestedge[v] != -1:
+                    d = slack(bestedge[v])
+                    if delta_type == -1 or d < delta:
+                        delta = d
+                        delta_type = 2
+                        delta_edge = bestedge[v]
+            for b in range(2 * vertex_count):
+                if blossomparent[b] == -1 and label[b] == 1 and bestedge[b] != -1:
+                    d = slack(bestedge[b]) // 2
+                    if delta_type == -1 or d < delta:
+                        delta = d
+                        delta_type = 3
+                        delta_edge = bestedge[b]
+            for b in range(vertex_count, 2 * vertex_count):
+                if blossombase[b] >= 0 and blossomparent[b] == -1 and label[b] == 2 and (delta_type == -1 or dualvar[b] < delta):
+                    delta = dualvar[b]
+                    delta_type = 4
+                    delta_blossom = b
+            if delta_type == -1:
+                # Only possible with max_cardinality: the matching can’t grow any more.
+                delta_type = 1
+                delta = max(0, min(dualvar[:vertex_count]))
+
+            for v in range(vertex_count):
+                if label[inblossom[v]] == 1:
+                    dualvar[v] -= delta
+                elif label[inblossom[v]] == 2:
+                    dualvar[v] += delta
+            for b in range(vertex_count, 2 * vertex_count):
+                if blossombase[b] >= 0 and blossomparent[b] == -1:
+                    if label[b] == 1:
+                        dualvar[b] += delta
+                    elif label[b] == 2:
+                        dualvar[b] -= delta
+
+            if delta_type == 1:
+                break
+            elif delta_type == 2:
+                allowedge[delta_edge] = True
+                i, j, weight = edges[delta_edge]
+                if label[inblossom[i]] == 0:
+                    i, j = j, i
+                queue.append(i)
+            elif delta_type == 3:
+                allowedge[delta_edge] = True
+                i, j, weight = edges[delta_edge]
+                queue.append(i)
+            elif delta_type == 4:
+                expand_blossom(delta_blossom, False)
+        if not augmented:
+            break
+        # Expand S-blossoms that have dropped to a dual of zero.
+        for b in range(vertex_count, 2 * vertex_count):
+            if blossomparent[b] == -1 and blossombase[b] >= 0 and label[b] == 1 and dualvar[b] == 0:
+                expand_blossom(b, True)
+
+    for v in range(vertex_count):
+        if mate[v] >= 0:
+            mate[v] = endpoint[mate[v]]
+    return mate
+
+def get_optimal_coord_pairs(selected_contours, occurrences, list_of_coordinates):
+    '''
+    Pairs up `list_of_coordinates` so the pairs are as short as possible in
+    total, rather than closest-first. Corners next to each other on a contour
+    are never paired. `occurrences` come from `get_coord_occurrences()`.
+    '''
+    coords = list(dict.fromkeys(list_of_coordinates))
+    coord_index = {coord: i for i, coord in enumerate(coords)}
+    positions = [[] for coord in coords]
+    for coord, c_index, pt_index in occurrences:
+        if coord in coord_index:
+            positions[coord_index[coord]].append((c_index, pt_index))
+
+    def are_contiguous(i, j):
+        for c_index, pt_index in positions[i]:
+            contour = selected_contours[c_index]
+            for other_c_index, other_pt_index in positions[j]:
+                if other_c_index != c_index:
+                    continue
+                gap = abs(pt_index - other_pt_index)
+                if gap <= 1 or (not contour.open and gap == len(contour.points) - 1):
+                    return True
+        return False
+
+    candidates = []
+    for i in range(len(coords)):
+        for j in range(i + 1, len(coords)):
+            dist = get_vector_distance(coords[i], coords[j])
+            if dist == 0 or are_contiguous(i, j):
+                continue
+            # Hundredths of a unit, so the matching can stick to whole numbers.
+            candidates.append((i, j, round(dist * 100)))
+    if not candidates:
+        return []
+    # Shortest total distance = heaviest matching, once the weights are flipped.
+    longest = max(dist for i, j, dist in candidates)
+    edges = [(i, j, 2 * (longest + 1 - dist)) for i, j, dist in candidates]
+    mate = max_weight_matching(edges, max_cardinality=True)
+    return [(coords[i], coords[j]) for i, j in enumerate(mate) if j > i]
+
+def break_dict_into_pairs(selected_contours, dictionary, pairing='nearest'):
+    '''
+    Splits {corner coordinates: results} into one dict per pair of corners.
+    `pairing` is 'nearest', which keeps taking the two closest corners left,
+    or 'optimal', which makes the pairs as short as possible overall.
+    '''
+    if len(dictionary.keys()) % 2 == 0 and len(dictionary.keys()) >= 2:
+        coords = list(dictionary.keys())
+        # Find the points once, rather than searching the contours for every pair.
+        occurrences = get_coord_occurrences(selected_contours, coords)
+        if pairing == 'optimal':
+            coord_pairs = get_optimal_coord_pairs(selected_contours, occurrences, coords)
+            coords = []
+        else:
+            coord_pairs = []
+        while len(coords) > 1:
+            two_noncontiguous = get_noncontiguous_near_coords(occurrences, coords)
+            if two_noncontiguous not in coord_pairs:
+                coord_pairs.append(two_noncontiguous)
+                for noncontig_coord in tuple(two_noncontiguous):
+                    if noncontig_coord in coords:
+                        coords.remove(noncontig_coord)
+                    else:
+                        print("Overlapper Error: (coord_pairs)", coord_pairs)
+            else:
+                break
+        # Rebuild mini pair dictionaries
+        pair_dicts = []
+        for pair in coord_pairs:
+            if len(pair) == 2:
+                new_dict = {pair[0]: dictionary[pair[0]], pair[1]: dictionary[pair[1]]}
+                pair_dicts.append(new_dict)
+        return pair_dicts
+    else:
+        return [dictionary]
+
+def check_continuous(runs, tolerance=COLLINEAR_TOLERANCE):
+    '''
+    For each run of coordinates in `runs`, whether all of them sit on one
+    line, give or take `tolerance` units. The line goes through the run’s
+    first point and the point furthest from it; every other point’s distance
+    to it comes from a cross product. Empty runs aren’t continuous.
+    '''
+    if numpy is not None and len(runs) >= NUMPY_MIN_RUNS:
+        return check_continuous_batch(runs, tolerance)
+    results = []
+    for run in runs:
+        if not run:
+            results.append(False)
+            continue
+        x0, y0 = run[0]
+        deltas = [(x - x0, y - y0) for x, y in run]
+        dx, dy = max(deltas, key=lambda d: d[0] * d[0] + d[1] * d[1])
+        length = sqrt(dx * dx + dy * dy)
+        # All at the same spot counts as a line.
+        results.append(all(abs(x * dy - y * dx) <= tolerance * length for x, y in deltas))
+    return results
+
+def check_continuous_batch(runs, tolerance=COLLINEAR_TOLERANCE):
+    '''`check_continuous()`, in one NumPy pass over all of the runs.'''
+    width = max(len(run) for run in runs)
+    # Pad short runs with their first point, which doesn’t change their line.
+    padded = numpy.array([list(run) + [run[0]] * (width - len(run)) if run else [(0, 0)] * width for run in runs], dtype=float)
+    deltas = padded - padded[:, :1]
+    squared = (deltas ** 2).sum(axis=2)
+    furthest = deltas[numpy.arange(len(runs)), squared.argmax(axis=1)]
+    lengths = numpy.sqrt((furthest ** 2).sum(axis=1))
+    cross = deltas[:, :, 0] * furthest[:, None, 1] - deltas[:, :, 1] * furthest[:, None, 0]
+    results = (numpy.abs(cross) <= tolerance * lengths[:, None]).all(axis=1)
+    return [bool(result) and len(run) > 0 for result, run in zip(results, runs)]
+
+def search_continuity(contours, pair_of_points, coord_index):
+    # Only contours with one of the pair in them can be continuous.
+    runs = []
+    for c, found in coord_index.group(pair_of_points, contours):
+        # Get the indexes of our central pair of points
+        indexes_to_analyze = [pt_index for pt_index, pt in found]
+        # Add contiguous points to the search
+        new_indexes_to_analyze = []
+        for i in indexes_to_analyze:
+            new_indexes_to_analyze.append(i)
+            if i + 1 not in new_indexes_to_analyze and i + 1 < len(c.points):
+                new_indexes_to_analyze.append(i + 1)
+            if i - 1 not in new_indexes_to_analyze:
+                if i - 1 == -1:
+                    new_indexes_to_analyze.append(len(c.points) - 1)
+                else:
+                    new_indexes_to_analyze.append(i - 1)
+        coords_to_analyze = [(c.points[pt_index].x, c.points[pt_index].y) for pt_index in sorted(set(new_indexes_to_analyze))]
+        runs.append(coords_to_analyze)
+    # Check if the coordinates of the four points segment runs along the same line, for every contour at once
+    return any(check_continuous(runs))
+
+
+# ======================================================================================
+# Contour surgery
+
+
+def break_contours(contours, point_coordinates, coord_index):
+    '''Breaks every contour at the on-curves found at `point_coordinates`, in place.'''
+    for c, found in coord_index.group(point_coordinates, contours):
+        break_indexes = [pt_index for pt_index, pt in found if pt.type != 'offcurve']
+        if c.open:
+            # The ends of an open contour are already broken.
+            break_indexes = [i for i in break_indexes if 0 < i < len(c.points) - 1]
+            if not break_indexes:
+                continue
+            bounds = [0] + break_indexes + [len(c.points) - 1]
+        else:
+            if not break_indexes:
+                continue
+            bounds = break_indexes + [break_indexes[0] + len(c.points)]
+        pieces = []
+        for start, end in zip(bounds, bounds[1:]):
+            points = [c.points[i % len(c.points)].copy() for i in range(start, end + 1)]
+            if start in break_indexes:
+                # The previous piece ends with this same point, and identifiers have to stay unique.
+                points[0].identifier = None
+            points[0].type, points[0].smooth = 'move', False
+            points[-1].smooth = False
+            pieces.append(OverlapContour(points))
+        pieces[0].identifier = c.identifier
+        index = contours.index(c)
+        contours[index:index + 1] = pieces
+        coord_index.remove_contour(c)
+        for piece in pieces:
+            coord_index.add_contour(piece)
+
+def add_contour_to_end(contours, contour_a, contour_b, coord_index):
+    '''Adds one contour to another'''
+    contours.remove(contour_b)
+    coord_index.remove_contour(contour_b)
+    for pt in contour_b.points:
+        pt = pt.copy()
+        if pt.type == 'move':
+            pt.type = 'line'
+        contour_a.points.append(pt)
+        coord_index.entries.setdefault(pt.coords, []).append((contour_a, pt))
+
+def close_contour_at_coords(contours, list_of_two_coords, coord_index):
+    found = []
+    for contour, points in coord_index.group(list_of_two_coords, contours):
+        # Make sure the one with point index `0` is the second one
+        if points[0][1].type != 'move':
+            found.insert(0, contour)
+        else:
+            found.append(contour)
+    # If it's the same contour, just close it.
+    if len(found) == 1:
+        for pt_index, pt in coord_index.group(list_of_two_coords, contours)[0][1]:
+            if pt.type == 'move': pt.type = 'line'
+    else:
+        try:
+            add_contour_to_end(contours, found[0], found[1], coord_index)
+        # Open contours, or outside corners of contour that doesn't overlap with others.
+        except IndexError:
+            pass
+
+def remove_point(contour, point):
+    '''Removes an on-curve point, keeping the curve around it (like fontParts’ `preserveCurve=True`).'''
+    index = contour.points.index(point)
+    del contour.points[index]
+    if not contour.points:
+        return
+    # Off-curves on both sides of the removed point: keep the outer handles.
+    start = index
+    while start > 0 and contour.points[start - 1].type == 'offcurve':
+        start -= 1
+    end = index
+    while end < len(contour.points) and contour.points[end].type == 'offcurve':
+        end += 1
+    if end - start > 2:
+        del contour.points[start + 1:end - 1]
+        end = start + 2
+    # Off-curves now leading into a line make that segment a curve.
+    if end > start and end < len(contour.points) and contour.points[end].type == 'line':
+        contour.points[end].type = 'curve'
+
+def convert_overlaps_to_cross_overlap(contours, dpd, coord_index=None):
+    if coord_index is None:
+        coord_index = CoordIndex(contours)
+    # List of all 4 flattened resulting points
+    all_points = []
+    for key, val in dpd.items():
+        all_points += (val.values())
+
+    # Break the contours
+    break_contours(contours, all_points, coord_index)
+
+    dict_keys = list(dpd.keys())
+    pairs_to_close_or_remove = [[dpd[dict_keys[0]]['in'], dpd[dict_keys[1]]['out']], [dpd[dict_keys[1]]['in'], dpd[dict_keys[0]]['out']]]
+
+    # Remove the short segments
+    for c, found in coord_index.group(all_points, contours):
+        # Remove the short segment contour if both points’ coordinates are in the list of coordinates.
+        if len(c.points) == 2 and len(found) == 2:
+            contours.remove(c)
+            coord_index.remove_contour(c)
+
+    # Close the gaps the opposite way.
+    for pair in pairs_to_close_or_remove:
+        close_contour_at_coords(contours, pair, coord_index)
+        close_contour_at_coords(contours, pair, coord_index)
+
+    # Remove two points if the four resulting points are along the same line
+    for pair in pairs_to_close_or_remove:
+        if search_continuity(contours, pair, coord_index) == True:
+            for c, found in coord_index.group(pair, contours):
+                coord_index.remove_contour(c)
+                for pt_index, pt in found:
+                    # Only on-curves, so there's no illegal point count
+                    if pt.type != 'offcurve':
+                        remove_point(c, pt)
+                coord_index.add_contour(c)
+
+
+# ======================================================================================
+# Overlapping
+
+
+def get_segment_length(args):
+    '''Arc length of a segment given as a list of coordinates: two for a line, four for a curve.'''
+    if len(args) == 4:
+        return approximateCubicArcLength(*args)
+    return get_vector_distance(args[0], args[1])
+
+
+class OverlapCorner:
+    '''
+    One selected corner: its inbound and outbound segments (as lists of
+    coordinates), and their arc lengths. Those don’t change while the tool
+    value does, so they’re measured once and reused for every new offset.
+    '''
+
+    __slots__ = ('key', 'in_args', 'out_args', 'in_dist', 'out_dist')
+
+    def __init__(self, key, in_args, out_args):
+        self.key = key
+        self.in_args = in_args
+        self.out_args = out_args
+        self.in_dist = get_segment_length(in_args)
+        self.out_dist = get_segment_length(out_args)
+
+    def __repr__(self):
+        return f"<OverlapCorner {self.key}>"
+
+
+def get_corner_result(corner, offset):
+    '''
+    Extends (or trims, if `offset` is negative) the inbound and outbound
+    segments of one corner by `offset` units, along their arc length.
+    '''
+    in_args, out_args = corner.in_args, corner.out_args
+    in_factor = (float(offset) + float(corner.in_dist)) / float(corner.in_dist)
+    out_factor = (float(offset) + float(corner.out_dist)) / float(corner.out_dist)
+
+    if len(in_args) == 4:
+        in_result = splitCubicAtT(in_args[0], in_args[1], in_args[2], in_args[3], in_factor)[0]
+    else:
+        in_result = lengthen_line(in_args[0], in_args[1], in_factor, "in")
+
+    if len(out_args) == 4:
+        out_result = splitCubicAtT(out_args[0], out_args[1], out_args[2], out_args[3], -(out_factor-1))[1]
+    else:
+        out_result = lengthen_line(out_args[0], out_args[1], -(out_factor-1), "out")
+    return in_result, out_result
+
+class CornerBatch:
+    '''
+    Many corners (all of the selected ones, or every corner in a font), with
+    their segments packed into arrays once. After that, every new offset is
+    one vectorized pass over all of them. Needs NumPy. Iterates like the
+    list of corners it was made from.
+    '''
+
+    def __init__(self, corners):
+        self.corners = list(corners)
+        self.in_dists = numpy.array([corner.in_dist for corner in self.corners], dtype=float)
+        self.out_dists = numpy.array([corner.out_dist for corner in self.corners], dtype=float)
+        # For the inbound and the outbound side: which corners have curves and which have lines, and their points.
+        self.sides = []
+        for side in range(2):
+            segments = [corner.out_args if side else corner.in_args for corner in self.corners]
+            curve_indexes = [i for i, seg in enumerate(segments) if len(seg) == 4]
+            line_indexes = [i for i, seg in enumerate(segments) if len(seg) != 4]
+            curves = numpy.array([segments[i] for i in curve_indexes], dtype=float).reshape(-1, 4, 2)
+            lines = numpy.array([segments[i] for i in line_indexes], dtype=float).reshape(-1, 2, 2)
+            self.sides.append((curve_indexes, curves, line_indexes, lines))
+
+    def __len__(self):
+        return len(self.corners)
+
+    def __iter__(self):
+        return iter(self.corners)
+
+    def get_results(self, offset):
+        '''Same as `get_corner_result()` for every corner. `offset` is a number, or a list with one per corner.'''
+        offsets = numpy.asarray(offset, dtype=float)
+        # Where along each segment the new in- and out-points fall. Beyond 1 or below 0 extends it.
+        in_ts = (offsets + self.in_dists) / self.in_dists
+        out_ts = -offsets / self.out_dists
+
+        results = [[None, None] for corner in self.corners]
+        for side, ts in enumerate((in_ts, out_ts)):
+            curve_indexes, curves, line_indexes, lines = self.sides[side]
+            if curve_indexes:
+                # de Casteljau, for every curve at once.
+                t = ts[curve_indexes][:, numpy.newaxis]
+                p0, p1, p2, p3 = curves[:, 0], curves[:, 1], curves[:, 2], curves[:, 3]
+                p01, p12, p23 = p0 + (p1 - p0) * t, p1 + (p2 - p1) * t, p2 + (p3 - p2) * t
+                p012, p123 = p01 + (p12 - p01) * t, p12 + (p23 - p12) * t
+                p0123 = p012 + (p123 - p012) * t
+                if side == 0:
+                    halves = numpy.stack([p0, p01, p012, p0123], axis=1)
+                else:
+                    halves = numpy.stack([p0123, p123, p23, p3], axis=1)
+                for i, half in zip(curve_indexes, halves.tolist()):
+                    results[i][side] = tuple(map(tuple, half))
+            if line_indexes:
+                t = ts[line_indexes][:, numpy.newaxis]
+                start, end = lines[:, 0], lines[:, 1]
+                new_pts = start + (end - start) * t
+                # Inbound lines end at the new point, outbound lines start at it.
+                pairs = numpy.stack([end, new_pts] if side == 0 else [new_pts, end], axis=1)
+                for i, pair in zip(line_indexes, pairs.tolist()):
+                    results[i][side] = tuple(map(tuple, pair))
+        return [tuple(result) for result in results]
+
+
+def batch_corners(corners):
+    '''Packs `corners` into a `CornerBatch` if there are enough of them and NumPy is around. Otherwise, returns them as they are.'''
+    if numpy is not None and len(corners) >= NUMPY_MIN_CORNERS:
+        return CornerBatch(corners)
+    return corners
+
+def get_corner_results(corners, offset):
+    '''
+    Returns (in_result, out_result) for each corner, in order. `offset` is a
+    number, or a list with one per corner. A `CornerBatch` (see `batch_corners()`)
+    does them all in one vectorized pass; a plain list of corners is done one
+    by one with `get_corner_result()`, which doesn’t need NumPy.
+    '''
+    if isinstance(corners, CornerBatch):
+        return corners.get_results(offset)
+    offsets = offset if isinstance(offset, (list, tuple)) else [offset] * len(corners)
+    return [get_corner_result(corner, corner_offset) for corner, corner_offset in zip(corners, offsets)]
+
+def get_selection_index(contours, selected_points):
+    '''
+    Maps the on-curve of each selected corner to (contour, segment index,
+    segment before, segment, segment after), in one pass over the points.
+    `selected_points` are points of `contours`; selecting an off-curve counts
+    for the on-curve that ends its segment. Corners next to a quadratic
+    segment are left out, they’d be extended as lines or cubics.
+    '''
+    selected_points = set(selected_points)
+    selection_index = {}
+    for c in contours:
+        segments = c.segments
+        for i, seg in enumerate(segments):
+            if not any(pt in selected_points for pt in seg):
+                continue
+            # The ends of open contours have nothing to overlap with.
+            if len(segments) < 2 or (c.open and (i == 0 or i == len(segments) - 1)):
+                continue
+            seg_after = segments[(i + 1) % len(segments)]
+            if seg[-1].type == 'qcurve' or seg_after[-1].type == 'qcurve':
+                continue
+            selection_index[seg[-1]] = (c, i, segments[i - 1], seg, seg_after)
+    return selection_index
+
+def get_corners(selection_index):
+    '''Measures the corners in a selection index (see `get_selection_index()`).'''
+    corners = {}
+    for c, i, seg_before, seg, seg_after in selection_index.values():
+        onC_before, onC_here, onC_after = seg_before[-1], seg[-1], seg_after[-1]
+
+        # Get inbound and outbound curve information for selected point
+        if len(seg) == 3:
+            in_args = [onC_before.coords] + [p.coords for p in seg]
+        else:
+            in_args = [onC_before.coords, onC_here.coords]
+        if len(seg_after) == 3:
+            out_args = [onC_here.coords] + [p.coords for p in seg_after]
+        else:
+            out_args = [onC_here.coords, onC_after.coords]
+        # Stacked points have no direction to extend in.
+        if in_args[0] == in_args[-1] or out_args[0] == out_args[-1]:
+            continue
+
+        corners[onC_here.coords] = OverlapCorner(onC_here.coords, in_args, out_args)
+    return list(corners.values())
+
+def extend_corners(corners, offset):
+    '''Returns the new in- and outbound segments of each corner, as two dicts keyed by the coordinates of the corners.'''
+    in_results = {}
+    out_results = {}
+    for corner, (in_result, out_result) in zip(corners, get_corner_results(corners, offset)):
+        in_results[corner.key], out_results[corner.key] = in_result, out_result
+    return (in_results, out_results)
+
+def get_selection_data(contours, selected_points, offset):
+    '''Works out the new in- and outbound segments for each selected corner, in one go.'''
+    return extend_corners(batch_corners(get_corners(get_selection_index(contours, selected_points))), offset)
+
+def overlap_contour(contour, in_results, out_results, slots=None):
+    '''
+    Returns a copy of `contour`, with the results of `get_selection_data()` applied to its corners.
+    If a `slots` list is given, the points that were moved or added for each
+    corner get recorded in it, as (corner key, inbound points, gap point, outbound off-curves).
+    '''
+    contour = contour.copy()
+    points = contour.points
+    point_count = len(points)
+    # Corners go in the order of fontParts’ segments, which start after the first on-curve of a
+    # closed contour, so that one comes last. It matters when both ends of a curve are corners:
+    # the later corner gets the last word on the off-curves between them.
+    first_point = points[0] if points else None
+    if not contour.open:
+        first_on_curve = next((i for i, pt in enumerate(points) if pt.type != 'offcurve'), None)
+        if first_on_curve is not None:
+            points = points[first_on_curve + 1:] + points[:first_on_curve + 1]
+    # One pass: every point goes into the new list, followed by a gap point if it’s a corner.
+    new_points = []
+
+    def get_neighbour(i, step):
+        # `step` points on from the last one in the new list, wrapping around, in the contour as it
+        # stands: the new list so far, then the old points after `i`. Nothing has to be inserted.
+        length = len(new_points) + point_count - i - 1
+        position = (len(new_points) - 1 + step) % length
+        if position < len(new_points):
+            return new_points[position]
+        return points[position - len(new_points) + i + 1]
+
+    for i, pt in enumerate(points):
+        new_points.append(pt)
+        key = pt.coords
+        if pt.type in ('offcurve', 'move') or key not in in_results or (contour.open and i == point_count - 1):
+            continue
+        in_result, out_result = in_results[key], out_results[key]
+        # Inbound segment ends at the new in-point.
+        if len(in_result) == 4:
+            before_2, before_1 = get_neighbour(i, -2), get_neighbour(i, -1)
+            before_2.x, before_2.y = in_result[-3]
+            before_1.x, before_1.y = in_result[-2]
+            in_points = [before_2, before_1, pt]
+        else:
+            in_points = [pt]
+        pt.x, pt.y = in_result[-1]
+        pt.smooth = False  # It's now a corner.
+        # Add a gap, with the new out-point
+        gap_point = OverlapPoint(out_result[0][0], out_result[0][1], 'line')
+        new_points.append(gap_point)
+        # Onto the next segment, change the off-curve positions
+        out_points = []
+        if len(out_result) == 4:
+            next_1, next_2 = get_neighbour(i, 1), get_neighbour(i, 2)
+            next_1.x, next_1.y = out_result[-3]
+            next_2.x, next_2.y = out_result[-2]
+            out_points = [next_1, next_2]
+        if slots is not None:
+            slots.append((key, in_points, gap_point, out_points))
+    if points is not contour.points:
+        # Back to the contour’s own start point
+        start = new_points.index(first_point)
+        new_points = new_points[start:] + new_points[:start]
+    contour.points = new_points
+    return contour
+
+
+class OverlapPreview:
+    '''
+    Overlapped copies of `contours`, set up once with a gap point after
+    each corner. From then on, `update()` only moves the points next to the
+    corners, so a frame costs as much as the number of corners, however big
+    the glyph is. Cross-overlaps change the structure, so they can’t use this.
+    '''
+
+    def __init__(self, contours, corners):
+        in_results, out_results = extend_corners(corners, 0)
+        self.slots = []
+        self.contours = []
+        # Indexes of the contours that have corners, and so will change.
+        self.changed_contours = set()
+        for i, c in enumerate(contours):
+            slot_count = len(self.slots)
+            self.contours.append(overlap_contour(c, in_results, out_results, slots=self.slots))
+            if len(self.slots) > slot_count:
+                self.changed_contours.add(i)
+        self.moving_points = set()
+        for key, in_points, gap_point, out_points in self.slots:
+            self.moving_points.update(in_points + [gap_point] + out_points)
+
+    def update(self, in_results, out_results):
+        # Same order as `overlap_contour()`, so corners that share a segment end up the same way.
+        for key, in_points, gap_point, out_points in self.slots:
+            in_result, out_result = in_results[key], out_results[key]
+            for pt, coords in zip(in_points, in_result[-len(in_points):]):
+                pt.x, pt.y = coords
+            gap_point.x, gap_point.y = out_result[0]
+            for pt, coords in zip(out_points, out_result[1:3]):
+                pt.x, pt.y = coords
+
+
+def cross_overlap(original_contours, contours, in_results, out_results, pairing='nearest'):
+    '''
+    Pairs up the overlapped corners in `contours` and rejoins them the
+    other way around, in place. Returns whether there was anything to pair.
+    See `break_dict_into_pairs()` for `pairing`.
+    '''
+    if not in_results or len(in_results) % 2 != 0:
+        return False
+    # Make a list of all of the coordinates of the resulting overlapped points.
+    base_and_results = {}
+    for key, val_in in in_results.items():
+        base_and_results[key] = {'in': [], 'out': []}
+        val_in = val_in[-1]
+        if not val_in == key:
+            base_and_results[key]['in'] = val_in
+        val_out = out_results[key][0]
+        if not val_out == key:
+            base_and_results[key]['out'] = val_out
+    # One index for all of the pairs, kept up to date as the contours are cut up and rejoined.
+    coord_index = CoordIndex(contours)
+    for b_and_r_pair in break_dict_into_pairs(original_contours, base_and_results, pairing):
+        convert_overlaps_to_cross_overlap(contours, b_and_r_pair, coord_index)
+    return True
+
+def overlap_contours(contours, selected_points, offset, cross=False, pairing='nearest'):
+    '''
+    The whole gesture in one go: overlaps (or chamfers, if `offset` is
+    negative) the selected corners, and cross-overlaps them if `cross` is on.
+    Returns the new contours, and whether a cross-overlap was made.
+    '''
+    in_results, out_results = get_selection_data(contours, selected_points, offset)
+    new_contours = [overlap_contour(c, in_results, out_results) for c in contours]
+    cross_success = False
+    if cross:
+        cross_success = cross_overlap(contours, new_contours, in_results, out_results, pairing)
+    return new_contours, cross_success
+
+
+# ======================================================================================
+# Masters
+
+
+def get_contour_signature(contours):
+    '''What has to match for contours to interpolate: how many there are, and each one’s point types, in order.'''
+    return tuple(tuple(pt.type for pt in c.points) for c in contours)
+
+def get_corner_positions(contours, selected_points):
+    '''
+    The corners a selection makes (see `get_corners()`), with the
+    (contour index, point index) of each one’s on-curve, as [(position, corner)].
+    '''
+    point_positions = {id(pt): (c_index, pt_index) for c_index, c in enumerate(contours) for pt_index, pt in enumerate(c.points)}
+    selection_index = get_selection_index(contours, selected_points)
+    positions = {pt.coords: point_positions[id(pt)] for pt in selection_index}
+    return [(positions[corner.key], corner) for corner in get_corners(selection_index)]
+
+def overlap_master(master, reference_corners, offset, cross=False, pairing='nearest'):
+    '''
+    Overlaps the corners of `master` at the same point indexes as
+    `reference_corners` (from `get_corner_positions()`). Each corner gets
+    `offset` scaled by how long its segments are, compared to the reference’s.
+    Returns the new contours.
+    '''
+    corner_by_key = {}
+    for corner in get_corners(get_selection_index(master, [master[c_index].points[pt_index] for (c_index, pt_index), ref in reference_corners])):
+        corner_by_key[corner.key] = corner
+    corners, offsets = [], []
+    for (c_index, pt_index), reference in reference_corners:
+        corner = corner_by_key.pop(master[c_index].points[pt_index].coords, None)
+        if corner is None:
+            continue
+        corners.append(corner)
+        offsets.append(offset * (corner.in_dist + corner.out_dist) / (reference.in_dist + reference.out_dist))
+    in_results, out_results = {}, {}
+    for corner, (in_result, out_result) in zip(corners, get_corner_results(batch_corners(corners), offsets)):
+        in_results[corner.key], out_results[corner.key] = in_result, out_result
+    new_contours = [overlap_contour(c, in_results, out_results) for c in master]
+    if cross:
+        cross_overlap(master, new_contours, in_results, out_results, pairing)
+    return new_contours
+
+def overlap_masters(contours, selected_points, offset, masters, cross=False, pairing='nearest'):
+    '''
+    Repeats an overlap of `contours` on each of `masters` (lists of contours
+    with the same structure, like the same glyph in other masters or layers),
+    at the same point indexes and with proportional offsets. Returns a list
+    with the new contours of each master, or None where it didn’t match
+    `contours` to begin with.
+
+    Masters are done one after another: it’s all pure Python, so threads
+    wouldn’t run them any faster. For many glyphs, overlapper_cli.py spreads
+    them over processes instead.
+    '''
+    signature = get_contour_signature(contours)
+    reference_corners = get_corner_positions(contours, selected_points)
+
+    return [
+        overlap_master(master, reference_corners, offset, cross, pairing) if get_contour_signature(master) == signature else None
+        for master in masters
+        ]
+
+def get_incompatible(contours, results):
+    '''Indexes of the `results` (from `overlap_masters()`) that don’t have the same structure as `contours` anymore, or never did.'''
+    signature = get_contour_signature(contours)
+    return [i for i, result in enumerate(results) if result is None or get_contour_signature(result) != signature]
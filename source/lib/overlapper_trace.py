@@ -0,0 +1,174 @@
+'''
+Overlapper’s timing spans.
+
+Methods decorated with `@tracer.span()` are timed with `perf_counter_ns`
+while the tracer is on. Each span goes into a histogram per name (for the
+whole session, until `reset()`) and a list of events, which can be written
+out as a JSON summary or as a Chrome trace (open it in chrome://tracing or
+https://ui.perfetto.dev). While it’s off, a decorated method costs one extra
+call and an attribute check.
+
+`export()` is cheap enough to call after every gesture: the summary is
+small, and only the events since the last export get appended to the trace.
+
+From RoboFont’s scripting window, after a slow editing session:
+
+    from overlapper_trace import tracer
+    tracer.export('~/Desktop/overlapper')
+'''
+
+import functools
+import json
+import os
+import time
+from collections import deque
+from itertools import islice
+
+
+# Span durations are counted in buckets that double in size, from 1 µs (1024 ns) up.
+BUCKET_COUNT = 32
+
+
+class SpanHistogram:
+    '''How long one kind of span took, over a session.'''
+
+    def __init__(self):
+        self.buckets = [0] * BUCKET_COUNT
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def add(self, duration_ns):
+        self.buckets[min(BUCKET_COUNT - 1, max(0, duration_ns.bit_length() - 10))] += 1
+        self.count += 1
+        self.total_ns += duration_ns
+        self.max_ns = max(self.max_ns, duration_ns)
+
+    def percentile(self, fraction):
+        '''The upper bound of the bucket that the percentile falls in, in ms.'''
+        if not self.count:
+            return 0
+        target = fraction * self.count
+        seen = 0
+        for bucket, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            if seen >= target:
+                return min(2 ** (bucket + 10), self.max_ns) / 1e6
+        return self.max_ns / 1e6
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'total_ms': self.total_ns / 1e6,
+            'mean_ms': self.total_ns / self.count / 1e6 if self.count else 0,
+            'p50_ms': self.percentile(0.5),
+            'p90_ms': self.percentile(0.9),
+            'p99_ms': self.percentile(0.99),
+            'max_ms': self.max_ns / 1e6,
+            # {upper bound in µs: count}, leaving out the empty buckets
+            'histogram_us': {str(2 ** (bucket + 10) // 1000): n for bucket, n in enumerate(self.buckets) if n},
+            }
+
+
+class Tracer:
+
+    def __init__(self, enabled=False, echo=False, max_events=100000):
+        self.enabled = enabled
+        # Print each span as it ends, like the old `timeit` did in DEBUG mode.
+        self.echo = echo
+        # Oldest events are dropped past this, so a long session doesn’t eat memory. Histograms keep counting.
+        self.max_events = max_events
+        self.reset()
+
+    def reset(self):
+        self.session_start_ns = time.perf_counter_ns()
+        self.histograms = {}
+        self.events = deque(maxlen=self.max_events)
+        # For `export()`: how many events there have been, how many of them are in the trace file, and which file.
+        self.event_count = 0
+        self.exported_count = 0
+        self.trace_path = None
+
+    def record(self, name, start_ns, duration_ns):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = SpanHistogram()
+        histogram.add(duration_ns)
+        self.events.append((name, start_ns, duration_ns))
+        self.event_count += 1
+        if self.echo:
+            print('%r  %2.2f ms' % (name, duration_ns / 1e6))
+
+    def span(self, name=None):
+        '''Decorator that times every call of a function, while the tracer is on.'''
+        def decorator(method):
+            span_name = name or method.__name__
+
+            @functools.wraps(method)
+            def traced(*args, **kwargs):
+                if not self.enabled:
+                    return method(*args, **kwargs)
+                start_ns = time.perf_counter_ns()
+                try:
+                    return method(*args, **kwargs)
+                finally:
+                    self.record(span_name, start_ns, time.perf_counter_ns() - start_ns)
+            return traced
+        return decorator
+
+    def summary(self):
+        return {name: histogram.summary() for name, histogram in sorted(self.histograms.items())}
+
+    def get_trace_events(self, events):
+        pid = os.getpid()
+        return [
+            {
+                'name': name,
+                'cat': 'overlapper',
+                'ph': 'X',
+                'ts': (start_ns - self.session_start_ns) / 1000,
+                'dur': duration_ns / 1000,
+                'pid': pid,
+                'tid': 0,
+            }
+            for name, start_ns, duration_ns in events
+            ]
+
+    def get_chrome_trace(self):
+        return {'traceEvents': self.get_trace_events(self.events), 'displayTimeUnit': 'ms'}
+
+    def export_json(self, path):
+        with open(os.path.expanduser(path), 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def export_chrome_trace(self, path):
+        with open(os.path.expanduser(path), 'w') as f:
+            json.dump(self.get_chrome_trace(), f)
+
+    def export(self, folder):
+        '''
+        Writes the summary into `folder`, and appends the events since the
+        last export to the trace there. Returns both paths.
+        '''
+        folder = os.path.expanduser(folder)
+        os.makedirs(folder, exist_ok=True)
+        summary_path = os.path.join(folder, 'overlapper-timings.json')
+        trace_path = os.path.join(folder, 'overlapper-trace.json')
+        self.export_json(summary_path)
+        # Chrome’s “JSON array” trace format doesn’t need its closing bracket, so events can keep being appended.
+        new_count = min(self.event_count - self.exported_count, len(self.events))
+        if trace_path != self.trace_path:
+            with open(trace_path, 'w') as f:
+                f.write('[\n')
+            self.trace_path = trace_path
+            new_count = len(self.events)
+        if new_count:
+            with open(trace_path, 'a') as f:
+                for event in self.get_trace_events(islice(self.events, len(self.events) - new_count, None)):
+                    f.write(json.dumps(event) + ',\n')
+        self.exported_count = self.event_count
+        return summary_path, trace_path
+
+
+# One tracer for the whole extension
+tracer = Tracer()
@@ -1,7 +1,10 @@
 import ezui
 from mojo.extensions import getExtensionDefault, setExtensionDefault
+from mojo.events import postEvent
 
 EXTENSION_KEY = 'com.ryanbugden.overlapper.settings'
+# Same as in overlapper.py, so settings that were never stored still show up filled in.
+DEFAULT_SETTINGS = {'hotkey': 'v', 'frameRate': 60, 'crossPairing': 0, 'syncMasters': 0, 'traceTimings': False}
 
 class Overlapper(ezui.WindowController):
 
@@ -10,6 +13,14 @@ class Overlapper(ezui.WindowController):
         * TwoColumnForm                     @form
         > : Hotkey:
         > [_v_]                             @hotkey
+        > : Frame rate:
+        > [_60_]                            @frameRate
+        > : Pairing:
+        > (Nearest first ...)               @crossPairing
+        > : Masters:
+        > (Only this one ...)               @syncMasters
+        > : Timings:
+        > [ ] Record                        @traceTimings
         ---
         """
         footer = """
@@ -17,14 +28,26 @@ class Overlapper(ezui.WindowController):
         """
         descriptionData = dict(
             form=dict(
-                titleColumnWidth=48,
-                itemColumnWidth=48
+                titleColumnWidth=70,
+                itemColumnWidth=120
             ),
             hotkey=dict(
                 placeholder="v",
                 valueType="string",
                 continuous=True,
             ),
+            frameRate=dict(
+                placeholder="60",
+                valueType="integer",
+            ),
+            crossPairing=dict(
+                # How Cross-Overlap pairs up more than 2 points
+                items=["Nearest first", "Shortest overall"],
+            ),
+            syncMasters=dict(
+                # Repeat each overlap on the same glyph elsewhere
+                items=["Only this one", "All open fonts", "All layers"],
+            ),
             applyButton=dict(
                 keyEquivalent=chr(13),
             )
@@ -40,7 +63,10 @@ class Overlapper(ezui.WindowController):
 
     def started(self):
         self.w.open()
-        prefs = getExtensionDefault(EXTENSION_KEY, fallback=self.w.getItemValues())
+        prefs = dict(DEFAULT_SETTINGS)
+        prefs.update(getExtensionDefault(EXTENSION_KEY, fallback={}))
+        if not prefs['frameRate']:
+            prefs['frameRate'] = DEFAULT_SETTINGS['frameRate']
         self.w.setItemValues(prefs)
         
     def hotkeyCallback(self, sender):
@@ -55,6 +81,8 @@ class Overlapper(ezui.WindowController):
 
     def register_defaults(self):
         setExtensionDefault(EXTENSION_KEY, self.w.getItemValues(), validate=True)
+        # Overlapper keeps its settings in memory, so let it know they changed.
+        postEvent(f"{EXTENSION_KEY}.overlapperSettingsDidChange")
         # Print a readout of the user’s updated Overlapper settings
         print("\nOverlapper settings:\n", getExtensionDefault(EXTENSION_KEY))  
 
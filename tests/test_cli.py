@@ -0,0 +1,157 @@
+'''
+Tests for the command line (overlapper_cli.py), on small UFOs written into
+a temporary folder. They only need fontTools and pytest.
+'''
+
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'source', 'lib'))
+from fontTools.ufoLib import UFOReader, UFOWriter
+import overlapper_cli as cli
+import overlapper_engine as engine
+
+
+SQUARE = [(0, 0), (0, 100), (100, 100), (100, 0)]
+T_SHAPE = [(0, 200), (0, 300), (300, 300), (300, 200), (200, 200), (200, 0), (100, 0), (100, 200)]
+
+
+class Glyph:
+    width = 500
+    unicodes = []
+
+
+def write_ufo(path, glyphs):
+    '''`glyphs` is {name: [contour]}, each contour a list of (x, y) or ((x, y), type, smooth, name).'''
+    writer = UFOWriter(path)
+    glyph_set = writer.getGlyphSet()
+    for glyph_name, contours in glyphs.items():
+        def draw_points(pen, contours=contours):
+            for contour in contours:
+                pen.beginPath()
+                for pt in contour:
+                    if isinstance(pt[0], (int, float)):
+                        pen.addPoint(pt, 'line')
+                    else:
+                        coords, pt_type, smooth, name = tuple(pt) + (False, None)[len(pt) - 2:]
+                        pen.addPoint(coords, pt_type, smooth=smooth, name=name)
+                pen.endPath()
+        glyph_set.writeGlyph(glyph_name, Glyph(), draw_points)
+    glyph_set.writeContents()
+    writer.writeLayerContents()
+    writer.close()
+    return str(path)
+
+def read_ufo(path, glyph_name):
+    reader = UFOReader(path)
+    glyph_set = reader.getGlyphSet()
+    pen = engine.ContourPointPen()
+    glyph_set.readGlyph(glyph_name, None, pen)
+    reader.close()
+    return [[(pt.x, pt.y, pt.type) for pt in c.points] for c in pen.contours]
+
+def get_glif_mtime(path, glyph_name):
+    return os.stat(os.path.join(path, 'glyphs', f'{glyph_name}.glif')).st_mtime_ns
+
+
+# ======================================================================================
+# Snapping and writing
+
+
+def test_only_moved_points_are_snapped(tmp_path):
+    # The second contour is all smooth points off the grid, so it isn't selected, and has to come back untouched.
+    round_contour = [((10.4, 50.6), 'curve', True), ((10.4, 80), None), ((40, 100.6), None), ((70.4, 100.6), 'curve', True), ((100, 100.6), None), ((130.4, 80), None)]
+    path = write_ufo(tmp_path / 'Font.ufo', {'a': [[(0, 0), (0, 100.3), (100, 100.3), (100, 0)], round_contour]})
+    cli.overlap_glyph(cli.GlyphSet(os.path.join(path, 'glyphs')), 'a', 10, {})
+    square, round_contour_after = read_ufo(path, 'a')
+    assert round_contour_after == [(x, y, pt_type or 'offcurve') for (x, y), pt_type, *rest in round_contour]
+    # The moved ones are on the grid.
+    assert all(x == int(x) and y == int(y) for x, y, pt_type in square if (x, y) != (0, 100.3) and (x, y) != (100, 100.3))
+
+def test_nothing_to_do_is_not_a_change(tmp_path):
+    # An open contour’s ends aren’t corners, so selecting them does nothing.
+    path = write_ufo(tmp_path / 'Font.ufo', {'a': [[((0, 0), 'move'), (0, 100)]]})
+    mtime = get_glif_mtime(path, 'a')
+    assert cli.overlap_glyph(cli.GlyphSet(os.path.join(path, 'glyphs')), 'a', 10, {}) is False
+    assert get_glif_mtime(path, 'a') == mtime
+
+
+# ======================================================================================
+# Picking corners
+
+def read_contours(tmp_path, contours):
+    path = write_ufo(tmp_path / 'Font.ufo', {'a': contours})
+    glyph, pen = cli.read_glyph(cli.GlyphSet(os.path.join(path, 'glyphs')), 'a')
+    return pen.contours
+
+def get_coords(points):
+    return [pt.coords for pt in points]
+
+def test_select_corners_rules(tmp_path):
+    contours = read_contours(tmp_path, [
+        [(0, 0), (0, 100), ((100, 100), 'line', False, 'overlap'), (200, 0)],
+        [((300, 0), 'line', False, 'overlap'), (300, 50), ((300, 80), None), ((320, 100), None), ((350, 100), 'curve', True), ((400, 100), None), ((400, 50), None), ((400, 0), 'curve')],
+        ])
+    assert get_coords(cli.select_corners(contours)) == [(0, 0), (0, 100), (100, 100), (200, 0), (300, 0), (300, 50), (400, 0)]
+    assert get_coords(cli.select_corners(contours, include_smooth=True)) == [(0, 0), (0, 100), (100, 100), (200, 0), (300, 0), (300, 50), (350, 100), (400, 0)]
+    assert get_coords(cli.select_corners(contours, point_names=['overlap'])) == [(100, 100), (300, 0)]
+    assert get_coords(cli.select_corners(contours, point_types=['curve'])) == [(400, 0)]
+    assert get_coords(cli.select_corners(contours, max_angle=60)) == [(200, 0)]
+    # All the rules have to match.
+    assert get_coords(cli.select_corners(contours, point_names=['overlap'], max_angle=100)) == [(300, 0)]
+
+def test_quadratic_corners_are_skipped(tmp_path):
+    contours = read_contours(tmp_path, [[(0, 0), (0, 100), ((50, 150), None), ((100, 100), 'qcurve'), (100, 0)]])
+    # Both ends of the quadratic would be extended as if it were a line.
+    selection_index = engine.get_selection_index(contours, cli.select_corners(contours))
+    assert sorted(pt.coords for pt in selection_index) == [(0, 0), (100, 0)]
+
+
+# ======================================================================================
+# Overlapping whole layers
+
+def make_glyphs(count):
+    glyphs = {f'g{i}': [[(x + i, y) for x, y in T_SHAPE]] for i in range(count)}
+    # Nothing to do in this one.
+    glyphs['open'] = [[((0, 0), 'move'), (0, 100)]]
+    return glyphs
+
+def test_overlap_layers_in_process_and_pooled(tmp_path):
+    glyphs = make_glyphs(12)
+    options = {'value': 10, 'rules': {'max_angle': 100}}
+    in_process = write_ufo(tmp_path / 'InProcess.ufo', glyphs)
+    pooled = write_ufo(tmp_path / 'Pooled.ufo', glyphs)
+    assert cli.overlap_layers([(in_process, None)], options, jobs=1) == {(in_process, None): [13, 12]}
+    # Small chunks, so the pool gets used.
+    assert cli.overlap_layers([(pooled, None)], options, jobs=2, chunk_size=2) == {(pooled, None): [13, 12]}
+    for glyph_name in glyphs:
+        assert read_ufo(in_process, glyph_name) == read_ufo(pooled, glyph_name)
+    assert read_ufo(in_process, 'g0') != [[(x, y, 'line') for x, y in T_SHAPE]]
+
+def test_overlap_layers_glyph_names_and_dry_run(tmp_path):
+    glyphs = make_glyphs(3)
+    path = write_ufo(tmp_path / 'Font.ufo', glyphs)
+    options = {'value': 10, 'rules': {}, 'dry_run': True}
+    assert cli.overlap_layers([(path, None)], options, glyph_names=['g1', 'open', 'missing'], jobs=1) == {(path, None): [2, 1]}
+    assert read_ufo(path, 'g1') == [[(x + 1, y, 'line') for x, y in T_SHAPE]]
+
+
+# ======================================================================================
+# Masters
+
+def test_sync_refuses_incompatible_masters(tmp_path):
+    light = write_ufo(tmp_path / 'Light.ufo', {'a': [T_SHAPE], 'b': [SQUARE]})
+    # This master’s 'a' has a point less, so it can’t get the same overlap.
+    bold = write_ufo(tmp_path / 'Bold.ufo', {'a': [[(x * 2, y * 2) for x, y in T_SHAPE[:-1]]], 'b': [[(x * 2, y * 2) for x, y in SQUARE]]})
+    mtimes = [get_glif_mtime(path, 'a') for path in (light, bold)]
+    sources = [(light, None), (bold, None)]
+    assert cli.overlap_layers(sources, {'value': 10, 'rules': {}}, jobs=1, sync=True) == {(light, None): [2, 1], (bold, None): [2, 1]}
+    # Neither master's 'a' is written, not even the reference's.
+    assert [get_glif_mtime(path, 'a') for path in (light, bold)] == mtimes
+    assert read_ufo(light, 'a') == [[(x, y, 'line') for x, y in T_SHAPE]]
+    # 'b' matches, and gets twice the overlap in the master twice the size.
+    light_b, = read_ufo(light, 'b')
+    bold_b, = read_ufo(bold, 'b')
+    assert len(light_b) == len(bold_b) == 8
+    assert bold_b == [(x * 2, y * 2, pt_type) for x, y, pt_type in light_b]
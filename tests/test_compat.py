@@ -0,0 +1,126 @@
+'''
+Tests for the compatibility check (overlapper_compat.py), on small UFOs
+written into a temporary folder. They only need fontTools and pytest.
+'''
+
+import json
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, '..', 'source', 'lib'))
+from fontTools.ufoLib import UFOReader
+import overlapper_compat as compat
+import overlapper_engine as engine
+from test_cli import SQUARE, T_SHAPE, write_ufo
+from test_engine import make_contour
+
+
+CURVED = [((0, 0), 'line'), ((0, 50), 'line'), ((0, 80), None), ((20, 100), None), ((50, 100), 'curve'), ((100, 100), 'line'), ((100, 0), 'line')]
+
+
+def rotate(points, shift):
+    return points[shift:] + points[:shift]
+
+def scale(points, factor):
+    return [(x * factor, y * factor) for x, y in points]
+
+def get_signature(contours):
+    '''The signature of contours given like in `write_ufo()`, all lines.'''
+    return compat.get_glyph_signature([make_contour(points) for points in contours])
+
+def read_layer_signature(path, glyph_name):
+    reader = UFOReader(path)
+    glyph_set = reader.getGlyphSet()
+    pen = engine.ContourPointPen()
+    glyph_set.readGlyph(glyph_name, None, pen)
+    reader.close()
+    return compat.get_glyph_signature(pen.contours, pen.components)
+
+
+# ======================================================================================
+# Signatures
+
+def test_moved_start_point_is_caught():
+    for points in (SQUARE, T_SHAPE):
+        reference = get_signature([points])
+        # Other masters can be a lot bigger, and still match.
+        assert get_signature([scale(points, 3)]) == reference
+        for shift in (1, len(points) - 1):
+            signature = get_signature([rotate(points, shift)])
+            # Same point types, so only the start offset tells.
+            assert signature[0] == reference[0]
+            assert signature != reference
+            assert compat.describe_difference(reference, signature).startswith("contour 0 starts at a different point")
+
+def test_start_offset():
+    assert compat.get_start_offset([(x, y, 'line') for x, y in T_SHAPE]) == 6
+    # Off-curves aren’t start points.
+    assert compat.get_start_offset([(0, 0, 'offcurve'), (0, 10, 'curve'), (10, 0, 'line')]) == 1
+    assert compat.get_start_offset([(0, 0, 'offcurve')]) == -1
+    assert compat.get_start_offset([]) == -1
+
+def test_glif_signature_matches_glyph_signature(tmp_path):
+    path = write_ufo(tmp_path / 'A.ufo', {'a': [T_SHAPE, CURVED, [((10, 10), 'move'), ((20, 20), 'line')]]})
+    reader = UFOReader(path)
+    glif_path = os.path.join(path, 'glyphs', reader.getGlyphSet().contents['a'])
+    reader.close()
+    signature = compat.read_glif_signature(glif_path)
+    assert signature == read_layer_signature(path, 'a')
+    assert signature[0] == ('llllllll', 'lloocll', 'ml')
+
+def test_describe_difference():
+    reference = get_signature([SQUARE, T_SHAPE])
+    assert compat.describe_difference(reference, get_signature([SQUARE])) == "1 contours instead of 2"
+    assert compat.describe_difference(reference, get_signature([SQUARE, T_SHAPE[:-1]])) == "contour 1 has 7 points instead of 8"
+    contours, components, starts = reference
+    assert compat.describe_difference(reference, (contours, ('b',), starts)) == "components b instead of none"
+    assert compat.describe_difference(reference, (('mlll', contours[1]), components, starts)) == "contour 0 is open"
+    assert compat.describe_difference(reference, (('llco', contours[1]), components, starts)) == "contour 0, point 2: curve instead of line"
+    curved = (('llll', 'lloocll'), components, starts)
+    assert compat.describe_difference(curved, (('llll', 'loocll' + 'l'), components, starts)) == "contour 1 starts at a different point"
+    assert compat.describe_difference(reference, reference) == "no difference"
+
+
+# ======================================================================================
+# Checking masters
+
+def test_check_masters_finds_moved_start(tmp_path):
+    light = write_ufo(tmp_path / 'Light.ufo', {'T': [T_SHAPE], 'O': [SQUARE]})
+    bold = write_ufo(tmp_path / 'Bold.ufo', {'T': [rotate(scale(T_SHAPE, 2), 1)], 'O': [scale(SQUARE, 2)]})
+    mismatches, read_count = compat.check_masters([(light, None), (bold, None)], jobs=1)
+    assert read_count == 4
+    assert [(glyph_name, master) for glyph_name, master, difference in mismatches] == [('T', (bold, None))]
+
+def test_cache_only_reads_changed_glyphs(tmp_path):
+    light = write_ufo(tmp_path / 'Light.ufo', {'T': [T_SHAPE], 'O': [SQUARE]})
+    bold = write_ufo(tmp_path / 'Bold.ufo', {'T': [scale(T_SHAPE, 2)], 'O': [scale(SQUARE, 2)]})
+    masters = [(light, None), (bold, None)]
+    cache_path = str(tmp_path / 'cache.json')
+
+    def check():
+        cache = compat.SignatureCache(cache_path)
+        result = compat.check_masters(masters, cache=cache, jobs=1)
+        cache.save()
+        return result
+
+    assert check() == ([], 4)
+    assert check() == ([], 0)
+    # Changing one glyph only reads that one again.
+    moved = write_ufo(tmp_path / 'Moved.ufo', {'T': [rotate(scale(T_SHAPE, 2), 7)]})
+    with open(os.path.join(moved, 'glyphs', 'T_.glif')) as f:
+        glif = f.read()
+    with open(os.path.join(bold, 'glyphs', 'T_.glif'), 'w') as f:
+        f.write(glif)
+    mismatches, read_count = check()
+    assert read_count == 1
+    assert [glyph_name for glyph_name, master, difference in mismatches] == ['T']
+
+    # A cache from another version is thrown out.
+    with open(cache_path) as f:
+        data = json.load(f)
+    data['version'] = compat.CACHE_VERSION - 1
+    with open(cache_path, 'w') as f:
+        json.dump(data, f)
+    assert check()[1] == 4
@@ -0,0 +1,416 @@
+'''
+Tests for the headless engine (overlapper_engine.py). They only need
+fontTools and pytest:
+
+    python -m pytest tests
+
+The differential tests compare the engine with the fontParts loop that
+Overlapper used before it had an engine. They’re skipped unless fontParts
+is installed.
+'''
+
+import itertools
+import os
+import random
+import sys
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'source', 'lib'))
+import overlapper_engine as engine
+
+
+T_SHAPE = [(0, 200), (0, 300), (300, 300), (300, 200), (200, 200), (200, 0), (100, 0), (100, 200)]
+L_SHAPE = [(0, 0), (300, 0), (300, 100), (100, 100), (100, 400), (0, 400)]
+
+
+def make_contour(points, is_open=False):
+    '''`points` are (x, y) for lines, or ((x, y), type).'''
+    contour = engine.OverlapContour([])
+    for i, pt in enumerate(points):
+        coords, pt_type = (pt, 'line') if isinstance(pt[0], (int, float)) else pt
+        if is_open and i == 0:
+            pt_type = 'move'
+        contour.points.append(engine.OverlapPoint(coords[0], coords[1], pt_type))
+    return contour
+
+def get_on_curves(contours):
+    return [pt for c in contours for pt in c.points if pt.type not in ('offcurve', 'move')]
+
+def rounded(contours, digits=2):
+    return [[(round(pt.x, digits), round(pt.y, digits), pt.type) for pt in c.points] for c in contours]
+
+def make_random_contour(rng, curves=True, is_open=False):
+    '''A few lines and curves on a grid. Returns None if two on-curves landed on the same spot.'''
+    points = []
+    for k in range(rng.randint(3, 7)):
+        x, y = rng.randint(0, 50) * 10, rng.randint(0, 50) * 10
+        if curves and k > 0 and rng.random() < 0.5:
+            points.append(((x + rng.randint(1, 40), y + rng.randint(1, 40)), 'offcurve'))
+            points.append(((x - rng.randint(1, 40), y + rng.randint(1, 40)), 'offcurve'))
+            points.append(((x, y), 'curve'))
+        else:
+            points.append(((x, y), 'line'))
+    if len({coords for coords, pt_type in points}) != len(points):
+        return None
+    return make_contour(points, is_open)
+
+
+# ======================================================================================
+# Overlaps and chamfers
+
+
+def test_overlap_square():
+    contour = make_contour([(0, 0), (0, 100), (100, 100), (100, 0)])
+    new_contours, cross_success = engine.overlap_contours([contour], get_on_curves([contour]), 20)
+    assert not cross_success
+    # Each corner is extended along its inbound segment, then a gap point goes out along the outbound one.
+    assert rounded(new_contours) == [[
+        (-20, 0, 'line'), (0, -20, 'line'),
+        (0, 120, 'line'), (-20, 100, 'line'),
+        (120, 100, 'line'), (100, 120, 'line'),
+        (100, -20, 'line'), (120, 0, 'line'),
+        ]]
+
+def test_chamfer_square():
+    contour = make_contour([(0, 0), (0, 100), (100, 100), (100, 0)])
+    new_contours, cross_success = engine.overlap_contours([contour], get_on_curves([contour]), -10)
+    coords = {(x, y) for x, y, pt_type in rounded(new_contours)[0]}
+    assert coords == {(0, 90), (10, 100), (90, 100), (100, 90), (100, 10), (90, 0), (10, 0), (0, 10)}
+
+def test_overlap_leaves_unselected_corners_alone():
+    contour = make_contour([(0, 0), (0, 100), (100, 100), (100, 0)])
+    new_contours, cross_success = engine.overlap_contours([contour], [contour.points[1]], 20)
+    assert rounded(new_contours) == [[(0, 0, 'line'), (0, 120, 'line'), (-20, 100, 'line'), (100, 100, 'line'), (100, 0, 'line')]]
+
+def test_overlap_does_not_change_the_input():
+    contour = make_contour([(0, 0), (0, 100), (100, 100), (100, 0)])
+    before = rounded([contour])
+    engine.overlap_contours([contour], get_on_curves([contour]), 20)
+    assert rounded([contour]) == before
+
+def test_curve_between_two_corners():
+    # Both ends of the curve are corners, and write its off-curves. The first on-curve goes last, like fontParts’ segments.
+    contour = make_contour([((0, 0), 'line'), ((0, 50), 'offcurve'), ((50, 100), 'offcurve'), ((100, 100), 'curve'), ((100, 0), 'line')])
+    new_contours, cross_success = engine.overlap_contours([contour], get_on_curves([contour]), 10)
+    off_curves = [(x, y) for x, y, pt_type in rounded(new_contours)[0] if pt_type == 'offcurve']
+    assert off_curves == [(-6.46, 43.34), (46.77, 100.0)]
+
+def test_curve_keeps_its_structure():
+    contour = make_contour([((0, 0), 'line'), ((0, 50), 'offcurve'), ((50, 100), 'offcurve'), ((100, 100), 'curve'), ((100, 0), 'line')])
+    for offset in (10, -10):
+        new_contours, cross_success = engine.overlap_contours([contour], [contour.points[3]], offset)
+        types = [pt.type for pt in new_contours[0].points]
+        assert types == ['line', 'offcurve', 'offcurve', 'curve', 'line', 'line']
+        assert new_contours[0].points[3].smooth is False
+
+def test_open_contour_ends_are_not_corners():
+    contour = make_contour([(0, 0), (0, 100), (100, 100), (100, 0)], is_open=True)
+    new_contours, cross_success = engine.overlap_contours([contour], contour.points, 20)
+    assert rounded(new_contours) == [[(0, 0, 'move'), (0, 120, 'line'), (-20, 100, 'line'), (120, 100, 'line'), (100, 120, 'line'), (100, 0, 'line')]]
+
+def test_preview_matches_overlap_contour():
+    rng = random.Random(1)
+    checked = 0
+    while checked < 200:
+        contour = make_random_contour(rng, is_open=rng.random() < 0.3)
+        if contour is None:
+            continue
+        selected = get_on_curves([contour])
+        corners = engine.batch_corners(engine.get_corners(engine.get_selection_index([contour], selected)))
+        preview = engine.OverlapPreview([contour], corners)
+        for offset in (15, -5):
+            in_results, out_results = engine.extend_corners(corners, offset)
+            preview.update(in_results, out_results)
+            assert rounded(preview.contours, 6) == rounded([engine.overlap_contour(contour, in_results, out_results)], 6)
+        checked += 1
+
+
+# ======================================================================================
+# The engine against references
+
+
+def overlap_contour_by_insertion(contour, in_results, out_results):
+    '''
+    The straightforward version of `overlap_contour()`: corners in segment
+    order (the first on-curve of a closed contour last), each one inserting its
+    gap point into the list as it goes.
+    '''
+    contour = contour.copy()
+    points = contour.points
+    rotation = 0
+    if not contour.open:
+        rotation = next(i for i, pt in enumerate(points) if pt.type != 'offcurve') + 1
+        points[:] = points[rotation:] + points[:rotation]
+    first_point = contour.points[-rotation] if rotation else points[0]
+    i = 0
+    while i < len(points):
+        pt = points[i]
+        key = pt.coords
+        if pt.type in ('offcurve', 'move') or key not in in_results or (contour.open and i == len(points) - 1):
+            i += 1
+            continue
+        in_result, out_result = in_results[key], out_results[key]
+        if len(in_result) == 4:
+            points[i - 2].x, points[i - 2].y = in_result[-3]
+            points[i - 1].x, points[i - 1].y = in_result[-2]
+        pt.x, pt.y = in_result[-1]
+        points.insert(i + 1, engine.OverlapPoint(out_result[0][0], out_result[0][1], 'line'))
+        if len(out_result) == 4:
+            points[(i + 2) % len(points)].x, points[(i + 2) % len(points)].y = out_result[-3]
+            points[(i + 3) % len(points)].x, points[(i + 3) % len(points)].y = out_result[-2]
+        i += 2
+    start = points.index(first_point)
+    contour.points = points[start:] + points[:start]
+    return contour
+
+@pytest.mark.parametrize('curves', [False, True])
+@pytest.mark.parametrize('is_open', [False, True])
+@pytest.mark.parametrize('offset', [20, -10])
+def test_overlap_contour_matches_insertion(curves, is_open, offset):
+    rng = random.Random(hash((curves, is_open, offset)) & 0xffff)
+    checked = 0
+    while checked < 300:
+        contour = make_random_contour(rng, curves, is_open)
+        if contour is None:
+            continue
+        selected = [pt for pt in get_on_curves([contour]) if rng.random() < 0.7]
+        try:
+            in_results, out_results = engine.get_selection_data([contour], selected, offset)
+        except ZeroDivisionError:
+            continue
+        expected = overlap_contour_by_insertion(contour, in_results, out_results)
+        assert rounded([engine.overlap_contour(contour, in_results, out_results)], 6) == rounded([expected], 6)
+        checked += 1
+
+
+def overlap_with_fontparts(glyph, in_results, out_results):
+    '''Overlapper’s fontParts loop, from before the engine (get_overlapped_glyph), without the debugging.'''
+    for c in glyph:
+        hits = 0
+        for i, seg in enumerate(c.segments):
+            if c.open:
+                i = i - 1
+            key = (seg.onCurve.x, seg.onCurve.y)
+            if key not in in_results:
+                continue
+            in_result, out_result = in_results[key], out_results[key]
+            if len(seg.points) == 3:
+                seg.offCurve[0].x, seg.offCurve[0].y = in_result[-3]
+                seg.offCurve[1].x, seg.offCurve[1].y = in_result[-2]
+            seg.onCurve.x, seg.onCurve.y = in_result[-1]
+            if i + 1 == len(c.segments) - hits:
+                c.insertSegment(0, type="line", points=[out_result[0]], smooth=False)
+                next_seg = c.segments[1]
+            else:
+                c.insertSegment(i + 1 + hits, type="line", points=[out_result[0]], smooth=False)
+                try:
+                    next_seg = c.segments[i + 2 + hits]
+                    if c.open:
+                        next_seg = c.segments[i + 3 + hits]
+                except IndexError:
+                    next_seg = c.segments[0]
+            if len(next_seg.points) == 3:
+                next_seg.offCurve[0].x, next_seg.offCurve[0].y = out_result[-3]
+                next_seg.offCurve[1].x, next_seg.offCurve[1].y = out_result[-2]
+            hits += 1
+
+@pytest.mark.parametrize('curves', [False, True])
+@pytest.mark.parametrize('is_open', [False, True])
+@pytest.mark.parametrize('offset', [10, -10])
+def test_overlap_contour_matches_fontparts(curves, is_open, offset):
+    fontparts_world = pytest.importorskip('fontParts.world')
+    rng = random.Random(hash((curves, is_open, offset, 'fontParts')) & 0xffff)
+    checked = 0
+    while checked < 200:
+        contour = make_random_contour(rng, curves, is_open)
+        if contour is None:
+            continue
+        glyph = fontparts_world.RGlyph()
+        contour.drawPoints(glyph.getPointPen())
+        try:
+            in_results, out_results = engine.get_selection_data([contour], get_on_curves([contour]), offset)
+        except ZeroDivisionError:
+            continue
+        overlap_with_fontparts(glyph, in_results, out_results)
+        assert rounded([engine.overlap_contour(contour, in_results, out_results)], 3) == rounded(engine.read_contours(glyph), 3)
+        checked += 1
+
+
+# ======================================================================================
+# Cross-overlaps
+
+
+@pytest.mark.parametrize('pairing', ['nearest', 'optimal'])
+def test_cross_overlap_t(pairing):
+    contour = make_contour(T_SHAPE)
+    new_contours, cross_success = engine.overlap_contours([contour], [contour.points[4], contour.points[7]], 30, cross=True, pairing=pairing)
+    assert cross_success
+    # The stem comes out of the bar, 30 units into it.
+    assert sorted(sorted((x, y) for x, y, pt_type in c) for c in rounded(new_contours)) == [
+        [(0, 200), (0, 300), (300, 200), (300, 300)],
+        [(100, 0), (100, 230), (200, 0), (200, 230)],
+        ]
+
+@pytest.mark.parametrize('selection', [(3, 0), (0, 3)])
+def test_cross_overlap_l(selection):
+    contour = make_contour(L_SHAPE)
+    new_contours, cross_success = engine.overlap_contours([contour], [contour.points[i] for i in selection], 30, cross=True)
+    assert cross_success
+    # A bar and a stem, each running 30 units past the other.
+    assert sorted(sorted((x, y) for x, y, pt_type in c) for c in rounded(new_contours)) == [
+        [(-30, 0), (70, 100), (300, 0), (300, 100)],
+        [(0, -30), (0, 400), (100, 70), (100, 400)],
+        ]
+
+def test_cross_overlap_needs_pairs():
+    contour = make_contour(L_SHAPE)
+    new_contours, cross_success = engine.overlap_contours([contour], [contour.points[3]], 30, cross=True)
+    assert not cross_success
+    assert len(new_contours) == 1 and len(new_contours[0].points) == 7
+
+@pytest.mark.parametrize('pairing', ['nearest', 'optimal'])
+def test_cross_overlap_many_ts(pairing):
+    contours, selected = [], []
+    for i in range(12):
+        contour = make_contour([(x + (i % 4) * 400, y + (i // 4) * 400) for x, y in T_SHAPE])
+        contours.append(contour)
+        selected += [contour.points[4], contour.points[7]]
+    new_contours, cross_success = engine.overlap_contours(contours, selected, 30, cross=True, pairing=pairing)
+    assert cross_success
+    assert len(new_contours) == 24
+    assert all(len(c.points) == 4 for c in new_contours)
+
+
+# ======================================================================================
+# Pieces
+
+
+def brute_force_matching_weight(vertex_count, weights):
+    best = 0
+    vertices = list(range(vertex_count))
+
+    def search(remaining, total):
+        nonlocal best
+        best = max(best, total)
+        if len(remaining) < 2:
+            return
+        first, rest = remaining[0], remaining[1:]
+        search(rest, total)
+        for other in rest:
+            if (first, other) in weights:
+                search([v for v in rest if v != other], total + weights[(first, other)])
+
+    search(vertices, 0)
+    return best
+
+def test_max_weight_matching():
+    rng = random.Random(3)
+    for trial in range(300):
+        vertex_count = rng.randint(2, 8)
+        weights = {}
+        for i, j in itertools.combinations(range(vertex_count), 2):
+            if rng.random() < 0.6:
+                weights[(i, j)] = rng.randint(1, 20)
+        edges = [(i, j, w) for (i, j), w in weights.items()]
+        mate = engine.max_weight_matching(edges)
+        total = 0
+        for i, j in enumerate(mate):
+            if j != -1:
+                assert mate[j] == i
+                if i < j:
+                    total += weights[(i, j)]
+        assert total == brute_force_matching_weight(vertex_count, weights)
+
+def test_snap_coordinates():
+    assert engine.snap_coordinates([(0.4, 0.6), (1.5, -1.5), (7, 12)], 1) == [(0, 1), (2, -2), (7, 12)]
+    assert engine.snap_coordinates([(7, 12)], 5) == [(5, 10)]
+
+def test_check_continuous():
+    assert engine.check_continuous([[(0, 0), (50, 0.2), (100, 0)], [(0, 0), (50, 10), (100, 0)]]) == [True, False]
+
+def test_coord_index():
+    contours = [make_contour(T_SHAPE), make_contour([(0, 0), (0, 100), (100, 100)])]
+    index = engine.CoordIndex(contours)
+    assert [(contour is contours[0], pt_index) for contour, pt_index, pt in index.find([(0, 200)])] == [(True, 0)]
+    index.remove_contour(contours[1])
+    assert index.find([(0, 100)]) == []
+    index.add_contour(contours[1])
+    assert [pt_index for contour, pt_index, pt in index.find([(0, 100)])] == [1]
+    # Results that didn’t move are empty, and skipped.
+    assert index.find([(), (0, 0)], contours) == [(contours[1], 0, contours[1].points[0])]
+
+
+def get_random_corners(rng, count):
+    '''At least `count` corners of random contours, lines and curves mixed.'''
+    corners = []
+    while len(corners) < count:
+        contour = make_random_contour(rng)
+        if contour is not None:
+            corners += engine.get_corners(engine.get_selection_index([contour], get_on_curves([contour])))
+    return corners
+
+def test_corner_batch_matches_corner_result():
+    pytest.importorskip('numpy')
+    rng = random.Random(9)
+    corners = get_random_corners(rng, engine.NUMPY_MIN_CORNERS + 16)
+    batch = engine.batch_corners(corners)
+    assert isinstance(batch, engine.CornerBatch)
+    assert {len(corner.in_args) for corner in corners} == {2, 4}
+    offsets = [rng.uniform(-15, 40) for corner in corners]
+    for offset, expected in ((25, [engine.get_corner_result(corner, 25) for corner in corners]), (offsets, list(map(engine.get_corner_result, corners, offsets)))):
+        results = engine.get_corner_results(batch, offset)
+        assert len(results) == len(expected)
+        for result, expected_result in zip(results, expected):
+            for segment, expected_segment in zip(result, expected_result):
+                assert len(segment) == len(expected_segment)
+                for coords, expected_coords in zip(segment, expected_segment):
+                    assert coords == pytest.approx(expected_coords, abs=1e-6)
+
+def test_check_continuous_batch_matches_loop(monkeypatch):
+    pytest.importorskip('numpy')
+    rng = random.Random(14)
+    runs = [[], [(5, 5)], [(5, 5), (5, 5), (5, 5)]]
+    while len(runs) < engine.NUMPY_MIN_RUNS * 2:
+        x0, y0, dx, dy = (rng.randint(-200, 200) for i in range(4))
+        # Points along a line, some of them nudged off it by up to twice the tolerance.
+        run = [(x0 + dx * t / 4 + rng.uniform(-1, 1) * (rng.random() < 0.3), y0 + dy * t / 4) for t in range(rng.randint(2, 6))]
+        runs.append(run)
+    assert engine.check_continuous(runs) == engine.check_continuous_batch(runs)
+    # The plain loop, however many runs there are.
+    monkeypatch.setattr(engine, 'NUMPY_MIN_RUNS', len(runs) + 1)
+    expected = engine.check_continuous(runs)
+    assert engine.check_continuous_batch(runs) == expected
+    assert True in expected and False in expected
+    assert expected[:3] == [False, True, True]
+
+
+# ======================================================================================
+# Masters
+
+
+def test_overlap_masters_scales_offsets():
+    reference = [make_contour(T_SHAPE)]
+    bold = [make_contour([(x * 2, y * 2) for x, y in T_SHAPE])]
+    selected = [reference[0].points[4], reference[0].points[7]]
+    new_contours, cross_success = engine.overlap_contours(reference, selected, 30)
+    results = engine.overlap_masters(reference, selected, 30, [bold])
+    assert engine.get_incompatible(new_contours, results) == []
+    # Twice as big, so twice the overlap
+    assert rounded(results[0]) == [[(x * 2, y * 2, pt_type) for x, y, pt_type in c] for c in rounded(new_contours)]
+
+def test_overlap_masters_skips_incompatible():
+    reference = [make_contour(T_SHAPE)]
+    other = [make_contour(T_SHAPE[:-1])]
+    selected = [reference[0].points[4]]
+    new_contours, cross_success = engine.overlap_contours(reference, selected, 30)
+    results = engine.overlap_masters(reference, selected, 30, [other, [make_contour(T_SHAPE)]])
+    assert results[0] is None
+    assert engine.get_incompatible(new_contours, results) == [0]
+
+def test_snap_coordinates_in_bulk():
+    # Past NUMPY_MIN_POINTS, NumPy does the rounding (when it’s installed). It has to agree with `my_round()`.
+    coords = [(i * 0.37 - 20, 15.5 - i * 1.25) for i in range(engine.NUMPY_MIN_POINTS * 2)]
+    for base in (1, 5, 0.5):
+        assert engine.snap_coordinates(coords, base) == [(engine.my_round(x, base), engine.my_round(y, base)) for x, y in coords]
@@ -0,0 +1,68 @@
+'''
+Tests for the timing spans (overlapper_trace.py). They only need pytest.
+'''
+
+import json
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'source', 'lib'))
+from overlapper_trace import SpanHistogram, Tracer
+
+
+def read_trace(path):
+    '''Chrome’s JSON array format can leave off its closing bracket, so add it back.'''
+    with open(path) as f:
+        text = f.read()
+    return json.loads(text.rstrip().rstrip(',') + ']')
+
+
+def test_histogram_percentiles():
+    histogram = SpanHistogram()
+    assert histogram.percentile(0.5) == 0
+    for i in range(90):
+        histogram.add(1500)
+    for i in range(10):
+        histogram.add(1000000)
+    summary = histogram.summary()
+    assert summary['count'] == 100
+    # The upper bound of the bucket, 2048 ns...
+    assert summary['p50_ms'] == summary['p90_ms'] == 0.002048
+    # ...but never past the slowest span.
+    assert summary['p99_ms'] == summary['max_ms'] == 1.0
+    assert summary['histogram_us'] == {'2': 90, '1048': 10}
+
+def test_span_only_records_while_enabled():
+    tracer = Tracer()
+
+    @tracer.span('work')
+    def work(value):
+        return value * 2
+
+    assert work(2) == 4
+    assert tracer.event_count == 0
+    tracer.enabled = True
+    assert work(3) == 6
+    assert tracer.summary()['work']['count'] == 1
+
+def test_export_appends_past_the_event_cap(tmp_path):
+    tracer = Tracer(enabled=True, max_events=5)
+    for i in range(3):
+        tracer.record('early', i * 1000, 100)
+    summary_path, trace_path = tracer.export(str(tmp_path))
+    assert [event['name'] for event in read_trace(trace_path)] == ['early'] * 3
+
+    # More events than the cap: the oldest of them are gone before they could be exported.
+    for i in range(10):
+        tracer.record('late', 3000 + i * 1000, 100)
+    tracer.export(str(tmp_path))
+    events = read_trace(trace_path)
+    assert [event['name'] for event in events] == ['early'] * 3 + ['late'] * 5
+    assert [event['ts'] for event in events[3:]] == [(8000 + i * 1000 - tracer.session_start_ns) / 1000 for i in range(5)]
+
+    # Nothing new, nothing appended. Histograms keep counting past the cap.
+    tracer.export(str(tmp_path))
+    assert len(read_trace(trace_path)) == 8
+    with open(summary_path) as f:
+        assert json.load(f)['late']['count'] == 10